@@ -8,7 +8,7 @@ import re
 import glob
 import pandas as pd
 from datetime import datetime, timedelta
-from typing import Dict, Optional, Tuple, List, Iterable
+from typing import Callable, Dict, Optional, Tuple, List, Iterable
 from langchain_openai import ChatOpenAI
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_chroma import Chroma
@@ -16,16 +16,27 @@ from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_community.document_loaders import PyPDFLoader, CSVLoader, TextLoader
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnablePassthrough
+from langchain_core.runnables import RunnableLambda, RunnablePassthrough
 from dotenv import load_dotenv
 from langchain_huggingface import HuggingFaceEmbeddings
 import hashlib
 import json
 from functools import lru_cache
+from collections import OrderedDict
+from contextlib import contextmanager
+import threading
 import time
 
+import metrics
+from logging_config import get_logger, sample_token
+from fake_llm import FakeLLM, fake_llm_enabled
+from chunking import chunk_csv, chunk_ids, chunk_pdf_pages, dedupe_chunks
+from reranker import RERANK_CANDIDATES, create_reranker, normalize_query
+
 load_dotenv()
 
+logger = get_logger("bot")
+
 # Configuration
 CHROMA_PERSIST_DIR = "./chroma_db"
 DOCS_DIR = "./documents"  # Pre-loaded knowledge base documents
@@ -34,9 +45,18 @@ GOLD_DATA_PATH = os.path.join(DOCS_DIR, "gold_data.csv")
 # Performance optimization settings
 CACHE_SIZE = 100  # Number of queries to cache
 CACHE_TTL = 3600  # Cache time-to-live in seconds
+RETRIEVAL_CACHE_SIZE = 500  # Retrieved-chunk lists kept per index version (profile-independent)
+STREAM_REPLAY_CHUNK_CHARS = int(os.getenv("STREAM_REPLAY_CHUNK_CHARS", "200"))  # Cached streams are replayed in chunks this size
+STREAM_REPLAY_DELAY_MS = float(os.getenv("STREAM_REPLAY_DELAY_MS", "0"))  # Optional pause between replayed chunks
 OPTIMIZED_CHUNK_SIZE = 350  # Smaller chunks for faster first query processing
 OPTIMIZED_CHUNK_OVERLAP = 35  # Optimized overlap for efficient retrieval
 OPTIMIZED_RETRIEVAL_K = 5  # Optimized to retrieve top 5 most relevant documents
+RETRIEVAL_FETCH_K = 10  # MMR candidates fetched before picking the k best
+RETRIEVAL_LAMBDA_MULT = 0.5  # MMR balance: 1 = pure relevance, 0 = maximum diversity
+STRUCTURED_PDF_CHUNKING = True  # Strip headers/footers, split on headings, drop near-duplicate chunks
+TABLE_CSV_INGESTION = True  # Group CSV rows into summarized blocks instead of one chunk per row
+STRUCTURED_CSV_SOURCES = {os.path.basename(GOLD_DATA_PATH)}  # Answered by direct lookup, never embedded
+INDEX_BATCH_SIZE = 256  # Chunks embedded per vector store write (progress is reported per batch)
 
 # Month name mappings for date parsing
 MONTH_NAMES = {
@@ -148,7 +168,7 @@ class GoldPriceLookup:
                 self.df = self.df.dropna(subset=['ParsedDate'])
                 self.df = self.df.sort_values('ParsedDate')
             except Exception as e:
-                print(f"Error loading gold data: {e}")
+                logger.error("Error loading gold data", extra={"path": self.csv_path, "error": str(e)})
                 self.df = None
     
     def get_price(self, date: datetime) -> Optional[Dict]:
@@ -256,32 +276,33 @@ class ResponseCache:
         self.max_size = max_size
         self.ttl = ttl
     
-    def _get_cache_key(self, query: str, profile: Optional[Dict] = None) -> str:
-        """Generate cache key from query and profile"""
+    def _get_cache_key(self, query: str, profile: Optional[Dict] = None, history: Optional[List[Dict]] = None) -> str:
+        """Generate cache key from query, profile and the chat history the prompt sees"""
         cache_data = {"query": query.lower().strip()}
         if profile:
-            # Only include key profile fields that affect recommendations
-            cache_data["profile"] = {
-                "age": profile.get("age"),
-                "income": profile.get("income"),
-                "taxRegime": profile.get("taxRegime")
-            }
+            # Profiles in the same bucket get the same advice, so they share answers
+            cache_data["profile"] = profile_bucket(profile)
+        if history:
+            # Follow-ups ("explain that more simply") depend on the conversation
+            cache_data["history"] = format_chat_history(history)
         return hashlib.md5(json.dumps(cache_data, sort_keys=True).encode()).hexdigest()
     
-    def get(self, query: str, profile: Optional[Dict] = None) -> Optional[Dict]:
+    def get(self, query: str, profile: Optional[Dict] = None, history: Optional[List[Dict]] = None) -> Optional[Dict]:
         """Get cached response if available and not expired"""
-        key = self._get_cache_key(query, profile)
+        key = self._get_cache_key(query, profile, history)
         if key in self.cache:
             cached_data, timestamp = self.cache[key]
             if time.time() - timestamp < self.ttl:
+                metrics.RESPONSE_CACHE_REQUESTS.inc(result="hit")
                 return cached_data
             else:
                 del self.cache[key]  # Remove expired entry
+        metrics.RESPONSE_CACHE_REQUESTS.inc(result="miss")
         return None
     
-    def set(self, query: str, response: Dict, profile: Optional[Dict] = None):
+    def set(self, query: str, response: Dict, profile: Optional[Dict] = None, history: Optional[List[Dict]] = None):
         """Cache a response with current timestamp"""
-        key = self._get_cache_key(query, profile)
+        key = self._get_cache_key(query, profile, history)
         
         # If cache is full, remove oldest entry
         if len(self.cache) >= self.max_size:
@@ -295,6 +316,71 @@ class ResponseCache:
         self.cache.clear()
 
 
+class RetrievalCache:
+    """
+    LRU of retrieved chunks keyed by normalized query and index version.
+    Any index write bumps the version, so stale entries are never served and age out.
+    """
+    
+    def __init__(self, max_size: int = RETRIEVAL_CACHE_SIZE):
+        self.cache: "OrderedDict[Tuple[str, int], List]" = OrderedDict()
+        self.max_size = max_size
+        self._lock = threading.Lock()
+    
+    def get(self, query: str, version: int) -> Optional[List]:
+        key = (normalize_query(query), version)
+        with self._lock:
+            docs = self.cache.get(key)
+            if docs is not None:
+                self.cache.move_to_end(key)
+        metrics.RETRIEVAL_CACHE_REQUESTS.inc(result="hit" if docs is not None else "miss")
+        return docs
+    
+    def set(self, query: str, version: int, docs: List):
+        key = (normalize_query(query), version)
+        with self._lock:
+            self.cache[key] = docs
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.max_size:
+                self.cache.popitem(last=False)
+    
+    def clear(self):
+        with self._lock:
+            self.cache.clear()
+
+
+class StageTimer:
+    """Accumulates wall-clock time per pipeline stage (ms) for one request"""
+    
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+    
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.stages[name] = round(self.stages.get(name, 0.0) + elapsed * 1000, 2)
+            metrics.CHAT_STAGE_DURATION.observe(elapsed, stage=name)
+
+
+def _has_child_under_10(profile: Dict) -> bool:
+    """childrenAges lists an age under 10 (Sukanya Samriddhi eligibility if a girl)"""
+    try:
+        ages = [int(age.strip()) for age in str(profile.get('childrenAges') or '').split(',') if age.strip()]
+    except ValueError:
+        return False
+    return any(age < 10 for age in ages)
+
+
+def _has_senior_parents(profile: Dict) -> bool:
+    """parentsAge mentions a senior citizen age (extra 80D deduction)"""
+    parents_age = str(profile.get('parentsAge') or '')
+    return '60' in parents_age or '65' in parents_age
+
+
 def format_user_profile(profile: Dict) -> str:
     """Format user profile information for the system prompt."""
     if not profile:
@@ -337,19 +423,13 @@ def format_user_profile(profile: Dict) -> str:
         profile_text += f"- **Children**: {profile.get('children')}"
         if profile.get('childrenAges'):
             profile_text += f" (Ages: {profile.get('childrenAges')})"
-            # Check for girl child under 10
-            try:
-                ages = [int(age.strip()) for age in profile.get('childrenAges', '').split(',') if age.strip()]
-                if any(age < 10 for age in ages):
-                    profile_text += " - Eligible for Sukanya Samriddhi Yojana if girl child"
-            except:
-                pass
+            if _has_child_under_10(profile):
+                profile_text += " - Eligible for Sukanya Samriddhi Yojana if girl child"
         profile_text += "\n"
     
     if profile.get('parentsAge'):
         profile_text += f"- **Parents Age**: {profile.get('parentsAge')}\n"
-        # Check if parents are senior citizens
-        if '60' in str(profile.get('parentsAge', '')) or '65' in str(profile.get('parentsAge', '')):
+        if _has_senior_parents(profile):
             profile_text += "  (Note: Additional 80D deduction for senior citizen parents - ₹50,000)\n"
     
     if profile.get('investmentCapacity'):
@@ -366,6 +446,55 @@ def format_user_profile(profile: Dict) -> str:
     return profile_text
 
 
+def _income_lakhs(income) -> Optional[float]:
+    """Annual income in lakhs from free text like '15 LPA', '₹1.2 Cr' or '1200000'"""
+    match = re.search(r"(\d+(?:\.\d+)?)\s*(cr|crore|l|lpa|lakh|lac|k)?", str(income or "").lower().replace(",", ""))
+    if not match:
+        return None
+    value, unit = float(match.group(1)), match.group(2)
+    if unit in ("cr", "crore"):
+        return value * 100
+    if unit == "k":
+        return value / 100
+    if unit is None and value >= 1000:
+        return value / 100000  # Plain rupees
+    return value
+
+
+def profile_bucket(profile: Optional[Dict]) -> Dict:
+    """
+    Coarse profile buckets mirroring the branches in format_user_profile.
+    Profiles in the same bucket get the same notes in the prompt, so the response
+    cache keys on this rather than on raw age and income.
+    """
+    profile = profile or {}
+    age = profile.get("age") or 0
+    emp_status = profile.get("employmentStatus") or ""
+    housing = profile.get("homeownerStatus") or ""
+
+    # Tax answers quote slab figures, so keep a coarse income band (new regime slab edges)
+    income = _income_lakhs(profile.get("income"))
+    if income is None:
+        income_band = None
+    elif income <= 12:
+        income_band = "upto_12l"
+    elif income <= 24:
+        income_band = "12l_to_24l"
+    else:
+        income_band = "above_24l"
+
+    return {
+        "age": "senior" if age >= 60 else ("near_retirement" if age >= 55 else "other"),
+        "employment": "government" if "Government" in emp_status else ("retired" if "Retired" in emp_status else "other"),
+        "regime": profile.get("taxRegime") if profile.get("taxRegime") in ("Old Regime", "New Regime") else None,
+        "housing": "loan" if "Loan" in housing else ("rented" if "Rented" in housing else "other"),
+        "girl_child_under_10": bool(profile.get("children")) and _has_child_under_10(profile),
+        "senior_parents": bool(profile.get("parentsAge")) and _has_senior_parents(profile),
+        "risk": profile.get("riskAppetite") if profile.get("riskAppetite") in ("Conservative", "Aggressive") else None,
+        "income": income_band,
+    }
+
+
 def format_chat_history(history: Optional[List[Dict]]) -> str:
     """Format recent chat history for the prompt."""
     if not history:
@@ -406,6 +535,25 @@ Recent chat: {chat_history}
 PROMPT_TEMPLATE = ChatPromptTemplate.from_template(SYSTEM_PROMPT)
 
 
+def find_documents(docs_dir: str = DOCS_DIR) -> List[str]:
+    """All supported knowledge base files under docs_dir, recursively."""
+    supported_extensions = ['*.pdf', '*.csv', '*.txt', '*.md']
+    files = []
+    for ext in supported_extensions:
+        files.extend(glob.glob(os.path.join(docs_dir, '**', ext), recursive=True))
+    return files
+
+
+def format_context(docs) -> str:
+    """Join retrieved chunks into the prompt's context block."""
+    return "\n\n".join([doc.page_content for doc in docs])
+
+
+def build_prompt(query: str, user_profile_text: str, chat_history_text: str, context: str) -> str:
+    """Fill SYSTEM_PROMPT for one request."""
+    return SYSTEM_PROMPT.replace("{user_profile}", user_profile_text).replace("{chat_history}", chat_history_text).replace("{context}", context).replace("{question}", query)
+
+
 class ArthMitraBot:
     """RAG-based financial assistant bot"""
     
@@ -415,10 +563,26 @@ class ArthMitraBot:
         self.rag_chain = None
         self.llm = None
         self._initialized = False
+        self._init_lock = threading.Lock()  # First chat request and ingestion workers may race to initialize
+        self._index_lock = threading.Lock()  # Background ingestion jobs share one vector store
         self._retriever = None
+        self.reranker = None  # Optional cross-encoder stage (RERANKER_ENABLED=1)
         self._indexed_files = set()
         self._response_cache = ResponseCache()
+        self._stream_cache = ResponseCache()  # Token sequences of completed streams
+        self._retrieval_cache = RetrievalCache()
+        self._index_version = 0  # Bumped on every vector store write or delete
         self._embeddings_cache = None  # Will store the model to avoid reloading
+        
+        # Chunking and retrieval settings (tools/rag_sweep.py compares alternatives)
+        self.chunk_size = OPTIMIZED_CHUNK_SIZE
+        self.chunk_overlap = OPTIMIZED_CHUNK_OVERLAP
+        self.retrieval_k = OPTIMIZED_RETRIEVAL_K
+        self.retrieval_fetch_k = RETRIEVAL_FETCH_K
+        self.retrieval_lambda_mult = RETRIEVAL_LAMBDA_MULT
+        self.structured_pdf_chunking = STRUCTURED_PDF_CHUNKING
+        self.table_csv_ingestion = TABLE_CSV_INGESTION
+        self.rerank_candidates = RERANK_CANDIDATES  # First-stage k when the reranker is on
 
     def _append_sources_section(self, response: str, sources: List[str]) -> str:
         """Append an explicit Sources section to the response body."""
@@ -428,9 +592,11 @@ class ArthMitraBot:
         return f"{response}\n\n---\nSources:\n{sources_lines}"
     
     def clear_cache(self):
-        """Clear the response cache"""
+        """Clear the response and retrieval caches"""
         self._response_cache.clear()
-        print("✅ Response cache cleared")
+        self._stream_cache.clear()
+        self._retrieval_cache.clear()
+        logger.info("Response cache cleared")
     
     def initialize(self, auto_index: bool = True):
         """Initialize the bot with embeddings and LLM"""
@@ -438,7 +604,9 @@ class ArthMitraBot:
         gemini_key = os.getenv("GEMINI_API_KEY")
         openrouter_key = os.getenv("OPENROUTER_API_KEY")
         
-        if not gemini_key and not openrouter_key:
+        use_fake_llm = fake_llm_enabled()
+        
+        if not gemini_key and not openrouter_key and not use_fake_llm:
             raise ValueError(
                 "No API key found. Set either GEMINI_API_KEY or OPENROUTER_API_KEY in .env file.\n"
                 "Gemini is recommended for better performance."
@@ -447,18 +615,21 @@ class ArthMitraBot:
         # Initialize embeddings with faster model and caching
         # Using a smaller, faster model for better performance
         if self._embeddings_cache is None:
-            print("🔄 Loading optimized embeddings model...")
+            logger.info("Loading embeddings model")
             self._embeddings_cache = HuggingFaceEmbeddings(
                 model_name="sentence-transformers/all-MiniLM-L6-v2",
                 model_kwargs={'device': 'cpu'},
                 encode_kwargs={'normalize_embeddings': True, 'batch_size': 32}  # Batch processing for speed
             )
         self.embeddings = self._embeddings_cache
-        print("✅ Embeddings model loaded")
+        logger.info("Embeddings model loaded")
         
-        # Initialize LLM - Prefer Gemini if available
-        if gemini_key:
-            print("🤖 Using Google Gemini AI (gemini-1.5-flash)")
+        # Initialize LLM - Offline fake for benchmarks, else prefer Gemini if available
+        if use_fake_llm:
+            logger.info("Using LLM", extra={"provider": "fake", "model": "deterministic"})
+            self.llm = FakeLLM()
+        elif gemini_key:
+            logger.info("Using LLM", extra={"provider": "gemini", "model": "gemini-1.5-flash"})
             self.llm = ChatGoogleGenerativeAI(
                 model="gemini-1.5-flash",
                 temperature=0.3,
@@ -466,13 +637,16 @@ class ArthMitraBot:
                 convert_system_message_to_human=True  # Gemini doesn't support system messages
             )
         else:
-            print("🤖 Using OpenRouter AI (gpt-4o-mini)")
+            logger.info("Using LLM", extra={"provider": "openrouter", "model": "gpt-4o-mini"})
             self.llm = ChatOpenAI(
                 model="openai/gpt-4o-mini",
                 temperature=0.3,
                 openai_api_key=openrouter_key,
                 openai_api_base="https://openrouter.ai/api/v1",
             )
+        
+        # Optional reranker: wider first-stage candidate set, best few chunks to the LLM
+        self.reranker = create_reranker()
 
         
         # Load or create vector store
@@ -500,22 +674,26 @@ class ArthMitraBot:
         
         return self
     
+    def ensure_initialized(self, auto_index: bool = True):
+        """Initialize once; concurrent callers wait for the first one instead of indexing twice"""
+        if not self._initialized:
+            with self._init_lock:
+                if not self._initialized:
+                    self.initialize(auto_index=auto_index)
+        return self
+    
     def _auto_index_documents(self):
         """Auto-index all documents from the documents folder"""
         if not os.path.exists(DOCS_DIR):
             os.makedirs(DOCS_DIR, exist_ok=True)
-            print(f"📁 Created {DOCS_DIR} folder. Add PDF/CSV/TXT files here for RAG.")
+            logger.info("Created documents folder; add PDF/CSV/TXT files here for RAG", extra={"path": DOCS_DIR})
             return
         
         # Get all supported files
-        supported_extensions = ['*.pdf', '*.csv', '*.txt', '*.md']
-        files_to_index = []
-        
-        for ext in supported_extensions:
-            files_to_index.extend(glob.glob(os.path.join(DOCS_DIR, '**', ext), recursive=True))
+        files_to_index = find_documents(DOCS_DIR)
         
         if not files_to_index:
-            print(f"📭 No documents found in {DOCS_DIR}. Add PDF/CSV/TXT files for knowledge base.")
+            logger.info("No documents found for knowledge base", extra={"path": DOCS_DIR})
             return
         
         # Check which files are already indexed (by checking metadata)
@@ -533,15 +711,15 @@ class ArthMitraBot:
         new_files = [f for f in files_to_index if os.path.basename(f) not in existing_sources]
         
         if new_files:
-            print(f"📚 Indexing {len(new_files)} new document(s)...")
+            logger.info("Indexing new documents", extra={"count": len(new_files)})
             for file_path in new_files:
                 try:
                     result = self.add_documents(file_path)
-                    print(f"  ✓ {result['message']}")
+                    logger.info(result["message"])
                 except Exception as e:
-                    print(f"  ✗ Failed to index {os.path.basename(file_path)}: {e}")
+                    logger.error("Failed to index document", extra={"file": os.path.basename(file_path), "error": str(e)})
         else:
-            print(f"✓ Knowledge base up to date ({len(existing_sources)} documents indexed)")
+            logger.info("Knowledge base up to date", extra={"documents": len(existing_sources)})
     
     def _format_docs(self, docs):
         """Format retrieved documents into a string with source info - optimized for speed"""
@@ -581,67 +759,155 @@ class ArthMitraBot:
         if doc_count > 0:
             # Use MMR (Maximal Marginal Relevance) for better diversity with fewer docs
             # This retrieves fewer but more relevant documents = faster queries
+            # With a reranker, MMR supplies a wider candidate set for it to narrow down
+            k = self.rerank_candidates if self.reranker is not None else self.retrieval_k
             self._retriever = self.vectorstore.as_retriever(
                 search_type="mmr",  # Changed from similarity to mmr for better relevance
                 search_kwargs={
-                    "k": OPTIMIZED_RETRIEVAL_K,  # Reduced from 5 to 3
-                    "fetch_k": 10,  # Fetch more candidates but return only k best
-                    "lambda_mult": 0.5  # Balance between relevance and diversity
+                    "k": k,
+                    "fetch_k": max(self.retrieval_fetch_k, 2 * k),  # Fetch more candidates but return only k best
+                    "lambda_mult": self.retrieval_lambda_mult  # Balance between relevance and diversity
                 }
             )
             
             self.rag_chain = (
-                {"context": self._retriever | self._format_docs, "question": RunnablePassthrough()}
+                {"context": RunnableLambda(self._retrieve) | self._format_docs, "question": RunnablePassthrough()}
                 | PROMPT_TEMPLATE
                 | self.llm
                 | StrOutputParser()
             )
     
-    def add_documents(self, file_path: str) -> Dict:
-        """Add documents to the knowledge base"""
+    def _retrieve(self, query: str, timer: Optional[StageTimer] = None, use_cache: bool = True) -> List:
+        """
+        First-stage MMR retrieval, then cross-encoder reranking when enabled.
+        Results are cached per normalized query for the current index version, so
+        personalized variants of the same question skip embedding and search.
+        """
+        timer = timer or StageTimer()
+        version = self._index_version  # Read first: a write during the search files the result under the old version
+        with timer.stage("retrieval"):
+            docs = self._retrieval_cache.get(query, version) if use_cache else None
+            if docs is not None:
+                return list(docs)
+            docs = self._retriever.invoke(query)
+        if self.reranker is not None:
+            with timer.stage("rerank"):
+                docs = self.reranker.rerank(query, docs)
+        if use_cache:
+            self._retrieval_cache.set(query, version, list(docs))
+        return docs
+    
+    def _bump_index_version(self):
+        """Invalidate cached retrievals after the index changed"""
+        self._index_version += 1
+    
+    def indexed_chunk_ids(self, file_path: str) -> List[str]:
+        """IDs of the chunks already in the vector store for this source path"""
+        if self.vectorstore is None:
+            return []
+        return self.vectorstore.get(where={"source": file_path}, include=[])["ids"]
+    
+    def delete_chunks(self, ids: Optional[List[str]] = None, source: Optional[str] = None) -> int:
+        """
+        Remove vectors by ID, or every vector of a source path
+        (documents indexed before chunk IDs were recorded). Returns the number removed.
+        """
+        with self._index_lock:
+            if ids is None:
+                ids = self.indexed_chunk_ids(source)
+            for start in range(0, len(ids), INDEX_BATCH_SIZE):
+                self.vectorstore.delete(ids=ids[start:start + INDEX_BATCH_SIZE])
+            if ids:
+                self._bump_index_version()
+        return len(ids)
+    
+    def reindex_document(self, file_path: str, progress: Optional[Callable[[str, float], None]] = None) -> Dict:
+        """
+        Re-chunk and re-embed a file with the current settings. New chunks are upserted
+        before stale ones are removed, so the document stays retrievable throughout.
+        """
+        previous = set(self.indexed_chunk_ids(file_path))
+        result = self.add_documents(file_path, progress=progress)
+        if result["status"] in ("success", "skipped"):
+            stale = list(previous - set(result.get("chunk_ids", [])))
+            result["chunks_removed"] = self.delete_chunks(stale)
+        return result
+    
+    def add_documents(self, file_path: str, progress: Optional[Callable[[str, float], None]] = None) -> Dict:
+        """
+        Add documents to the knowledge base.
+        progress(stage, fraction) is called as loading, chunking and embedding advance.
+        """
+        report = progress or (lambda stage, fraction: None)
         if not self._initialized:
             raise RuntimeError("Bot not initialized. Call initialize() first.")
         
         # Determine loader based on file type
         file_ext = os.path.splitext(file_path)[1].lower()
+        file_name = os.path.basename(file_path)
+        
+        if file_ext == ".csv" and file_name in STRUCTURED_CSV_SOURCES:
+            # Row-level embeddings of price tables retrieve poorly; GoldPriceLookup serves them
+            return {
+                "status": "skipped",
+                "message": f"Indexed 0 chunks from {file_name} (served by structured lookup)",
+                "chunks_indexed": 0,
+                "chunk_ids": []
+            }
         
         if file_ext == ".pdf":
             loader = PyPDFLoader(file_path)
         elif file_ext == ".csv":
-            loader = CSVLoader(file_path)
+            loader = None if self.table_csv_ingestion else CSVLoader(file_path)
         elif file_ext in [".txt", ".md"]:
             loader = TextLoader(file_path)
         else:
             return {"status": "error", "message": f"Unsupported file type: {file_ext}"}
         
         # Load and split documents with optimized chunk sizes
-        documents = loader.load()
+        report("loading", 0.0)
+        documents = loader.load() if loader else []
+        report("chunking", 0.1)
         
         # Smaller chunks = faster retrieval and less token usage
         text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=OPTIMIZED_CHUNK_SIZE,
-            chunk_overlap=OPTIMIZED_CHUNK_OVERLAP,
+            chunk_size=self.chunk_size,
+            chunk_overlap=self.chunk_overlap,
             separators=["\n\n", "\n", ".", " "]
         )
         
-        splits = text_splitter.split_documents(documents)
-        
-        # Add to vector store
-        self.vectorstore.add_documents(splits)
+        if file_ext == ".pdf" and self.structured_pdf_chunking:
+            # Section-aware chunks carry 'section' metadata; boilerplate repeats are dropped
+            splits = chunk_pdf_pages(documents, self.chunk_size, self.chunk_overlap)
+        elif file_ext == ".csv" and self.table_csv_ingestion:
+            # Row blocks grouped by year/category with a schema header and numeric summary
+            splits = chunk_csv(file_path)
+        else:
+            splits = dedupe_chunks(text_splitter.split_documents(documents))
         
-        # Recreate RAG chain with updated vectorstore
-        self._create_rag_chain()
+        # Add to vector store in large batches; writers take turns so concurrent jobs don't interleave
+        report("embedding", 0.2)
+        ids = chunk_ids(splits)
+        with self._index_lock:
+            for start in range(0, len(splits), INDEX_BATCH_SIZE):
+                batch = splits[start:start + INDEX_BATCH_SIZE]
+                metrics.EMBEDDING_BATCH_SIZE.observe(len(batch))
+                self.vectorstore.add_documents(batch, ids=ids[start:start + INDEX_BATCH_SIZE])
+                report("embedding", 0.2 + 0.8 * (start + len(batch)) / len(splits))
+            self._bump_index_version()
+            
+            # Recreate RAG chain with updated vectorstore
+            self._create_rag_chain()
         
         return {
             "status": "success",
-            "message": f"Indexed {len(splits)} chunks from {os.path.basename(file_path)}"
+            "message": f"Indexed {len(splits)} chunks from {file_name}",
+            "chunks_indexed": len(splits),
+            "chunk_ids": ids
         }
     
     def _extract_text(self, content) -> str:
         """Extract text from LLM response content"""
-        # Debug: log what we receive
-        print(f"[DEBUG] _extract_text received: type={type(content)}, value={repr(content)[:100]}")
-        
         if content is None:
             return ""
         if isinstance(content, str):
@@ -704,6 +970,7 @@ Here is the gold price data for **{requested_date_readable}**:
 *Note: Prices are in USD per troy ounce.*
 
 If you have any questions about investing in gold (like Sovereign Gold Bonds, Gold ETFs, or physical gold) or their tax implications, feel free to ask!"""
+            return {"response": response, "sources": ["gold_data.csv"]}
 
         # Try to get nearest price if exact not found
         nearest_data, explanation = gold_lookup.get_nearest_price(parsed_date)
@@ -727,6 +994,7 @@ I don't have gold price data for **{requested_date_readable}** (this may be a ho
 *Note: Prices are in USD per troy ounce.*
 
 If you need information about gold investment options available in India, such as Sovereign Gold Bonds (SGB), Gold ETFs, or Digital Gold, I'd be happy to help!"""
+            return {"response": response, "sources": ["gold_data.csv"]}
 
         # No data available at all
         date_range = gold_lookup.get_date_range()
@@ -739,30 +1007,51 @@ If you need information about gold investment options available in India, such a
 I don't have gold price data for **{requested_date_readable}**.{range_info}
 
 If you have questions about current gold investment options in India or tax implications of gold investments, I would be happy to assist!"""
-        
-    def get_response(self, query: str, profile: Optional[Dict] = None, history: Optional[List[Dict]] = None) -> Dict:
-        """Get AI response for a user query with caching"""
+        return {"response": response, "sources": ["gold_data.csv"]}
+    
+    def _extract_token_usage(self, message) -> Optional[int]:
+        """Total tokens reported in an LLM message's usage metadata, if any"""
+        usage = getattr(message, "usage_metadata", None)
+        if usage and usage.get("total_tokens") is not None:
+            return usage["total_tokens"]
+        token_usage = (getattr(message, "response_metadata", None) or {}).get("token_usage") or {}
+        return token_usage.get("total_tokens")
+    
+    def get_response(self, query: str, profile: Optional[Dict] = None, history: Optional[List[Dict]] = None, profile_text: Optional[str] = None) -> Dict:
+        """
+        Get AI response for a user query with caching (profile_text: pre-formatted profile block).
+        The result includes 'cached', 'tokens_used' and per-stage 'timings' in ms.
+        """
         if not self._initialized:
             raise RuntimeError("Bot not initialized. Call initialize() first.")
         
+        timer = StageTimer()
+        
         # Check cache first (skip for gold queries which need real-time data)
-        if not is_gold_price_query(query):
-            cached_response = self._response_cache.get(query, profile)
+        with timer.stage("intent_check"):
+            gold_query = is_gold_price_query(query)
+        if not gold_query:
+            with timer.stage("cache_lookup"):
+                cached_response = self._response_cache.get(query, profile, history)
             if cached_response:
-                print("⚡ Cache hit - returning cached response")
-                return cached_response
+                logger.debug("Response cache hit")
+                return {**cached_response, "cached": True, "tokens_used": None, "timings": timer.stages}
         
         # Check if this is a gold price query with a specific date
-        gold_response = self._handle_gold_price_query(query)
+        with timer.stage("intent_check"):
+            gold_response = self._handle_gold_price_query(query)
         if gold_response:
             gold_response["response"] = self._append_sources_section(
                 gold_response["response"], gold_response.get("sources", [])
             )
-            return gold_response
+            return {**gold_response, "cached": False, "tokens_used": None, "timings": timer.stages}
         
         # Format user profile for context
-        user_profile_text = format_user_profile(profile) if profile else ""
-        chat_history_text = format_chat_history(history)
+        with timer.stage("prompt_assembly"):
+            if profile_text is None:
+                profile_text = format_user_profile(profile) if profile else ""
+            user_profile_text = profile_text
+            chat_history_text = format_chat_history(history)
         
         # Check document count
         try:
@@ -772,8 +1061,10 @@ If you have questions about current gold investment options in India or tax impl
         
         # If no documents indexed, use direct LLM response
         if self.rag_chain is None or doc_count == 0:
-            prompt = SYSTEM_PROMPT.replace("{user_profile}", user_profile_text).replace("{chat_history}", chat_history_text).replace("{context}", "No specific documents available.").replace("{question}", query)
-            response = self.llm.invoke(prompt)
+            with timer.stage("prompt_assembly"):
+                prompt = build_prompt(query, user_profile_text, chat_history_text, "No specific documents available.")
+            with timer.stage("llm_generation"):
+                response = self.llm.invoke(prompt)
             sources = ["General Knowledge - No documents indexed yet"]
             response_text = self._append_sources_section(
                 self._extract_text(response.content),
@@ -781,18 +1072,22 @@ If you have questions about current gold investment options in India or tax impl
             )
             return {
                 "response": response_text,
-                "sources": sources
+                "sources": sources,
+                "cached": False,
+                "tokens_used": self._extract_token_usage(response),
+                "timings": timer.stages
             }
         
         # Get source documents for citation
-        source_docs = self._retriever.invoke(query)
+        source_docs = self._retrieve(query, timer)
         
         # Create a custom prompt with profile
-        context = "\n\n".join([doc.page_content for doc in source_docs])
-        prompt = SYSTEM_PROMPT.replace("{user_profile}", user_profile_text).replace("{chat_history}", chat_history_text).replace("{context}", context).replace("{question}", query)
+        with timer.stage("prompt_assembly"):
+            prompt = build_prompt(query, user_profile_text, chat_history_text, format_context(source_docs))
         
         # Use LLM directly with the customized prompt
-        response = self.llm.invoke(prompt)
+        with timer.stage("llm_generation"):
+            response = self.llm.invoke(prompt)
         result = self._extract_text(response.content)
         
         # Extract sources
@@ -813,23 +1108,75 @@ If you have questions about current gold investment options in India or tax impl
         }
         
         # Cache the response for future queries
-        self._response_cache.set(query, response_data, profile)
+        self._response_cache.set(query, response_data, profile, history)
         
-        return response_data
+        return {
+            **response_data,
+            "cached": False,
+            "tokens_used": self._extract_token_usage(response),
+            "timings": timer.stages
+        }
 
-    def stream_response(self, query: str, profile: Optional[Dict] = None, history: Optional[List[Dict]] = None) -> Tuple[Iterable[str], List[str]]:
-        """Stream AI response tokens for a user query."""
+    def stream_response(self, query: str, profile: Optional[Dict] = None, history: Optional[List[Dict]] = None, profile_text: Optional[str] = None, stats: Optional[Dict] = None) -> Tuple[Iterable[str], List[str]]:
+        """
+        Stream AI response tokens for a user query (profile_text: pre-formatted profile block).
+        If a stats dict is passed it is filled with per-stage 'timings' (ms), 'tokens_used' and 'cached';
+        llm_generation and tokens_used are only final once the stream is exhausted.
+        Completed streams are cached and replayed without calling the LLM.
+        """
         if not self._initialized:
             raise RuntimeError("Bot not initialized. Call initialize() first.")
 
-        gold_response = self._handle_gold_price_query(query)
+        timer = StageTimer()
+        if stats is not None:
+            stats["timings"] = timer.stages
+            stats["tokens_used"] = None
+            stats["cached"] = False
+
+        def llm_stream(prompt, cache_sources: Optional[List[str]] = None):
+            tokens_used = None
+            tokens = []
+            with timer.stage("llm_generation"):
+                for index, chunk in enumerate(self.llm.stream(prompt)):
+                    if sample_token(logger, index):
+                        logger.debug("LLM stream chunk", extra={"index": index, "content_type": type(chunk.content).__name__})
+                    usage = self._extract_token_usage(chunk)
+                    if usage is not None:
+                        tokens_used = (tokens_used or 0) + usage
+                    text = self._extract_text(chunk.content)
+                    if text:
+                        tokens.append(text)
+                        yield text
+            if stats is not None:
+                stats["tokens_used"] = tokens_used
+            # Only reached when the client consumed the whole stream
+            if cache_sources is not None and tokens:
+                self._stream_cache.set(query, {"tokens": tokens, "sources": cache_sources}, profile, history)
+
+        # Check cache first (skip for gold queries which need real-time data)
+        with timer.stage("intent_check"):
+            gold_query = is_gold_price_query(query)
+        if not gold_query:
+            with timer.stage("cache_lookup"):
+                cached_stream = self._stream_cache.get(query, profile, history)
+            if cached_stream:
+                logger.debug("Stream cache hit")
+                if stats is not None:
+                    stats["cached"] = True
+                return self.replay_stream(cached_stream["tokens"]), cached_stream["sources"]
+
+        with timer.stage("intent_check"):
+            gold_response = self._handle_gold_price_query(query)
         if gold_response:
             def gold_stream():
                 yield gold_response["response"]
             return gold_stream(), gold_response.get("sources", ["gold_data.csv"])
 
-        user_profile_text = format_user_profile(profile) if profile else ""
-        chat_history_text = format_chat_history(history)
+        with timer.stage("prompt_assembly"):
+            if profile_text is None:
+                profile_text = format_user_profile(profile) if profile else ""
+            user_profile_text = profile_text
+            chat_history_text = format_chat_history(history)
 
         try:
             doc_count = self.vectorstore._collection.count()
@@ -837,20 +1184,14 @@ If you have questions about current gold investment options in India or tax impl
             doc_count = 0
 
         if self.rag_chain is None or doc_count == 0:
-            prompt = SYSTEM_PROMPT.replace("{user_profile}", user_profile_text).replace("{chat_history}", chat_history_text).replace("{context}", "No specific documents available.").replace("{question}", query)
+            with timer.stage("prompt_assembly"):
+                prompt = build_prompt(query, user_profile_text, chat_history_text, "No specific documents available.")
             sources = ["General Knowledge - No documents indexed yet"]
+            return llm_stream(prompt), sources
 
-            def no_doc_stream():
-                for chunk in self.llm.stream(prompt):
-                    text = self._extract_text(chunk.content)
-                    if text:
-                        yield text
-
-            return no_doc_stream(), sources
-
-        source_docs = self._retriever.invoke(query)
-        context = "\n\n".join([doc.page_content for doc in source_docs])
-        prompt = SYSTEM_PROMPT.replace("{user_profile}", user_profile_text).replace("{chat_history}", chat_history_text).replace("{context}", context).replace("{question}", query)
+        source_docs = self._retrieve(query, timer)
+        with timer.stage("prompt_assembly"):
+            prompt = build_prompt(query, user_profile_text, chat_history_text, format_context(source_docs))
 
         sources = []
         for doc in source_docs:
@@ -864,13 +1205,24 @@ If you have questions about current gold investment options in India or tax impl
 
         final_sources = sources if sources else ["Knowledge Base"]
 
-        def doc_stream():
-            for chunk in self.llm.stream(prompt):
-                text = self._extract_text(chunk.content)
-                if text:
-                    yield text
-
-        return doc_stream(), final_sources
+        return llm_stream(prompt, final_sources), final_sources
+    
+    def replay_stream(self, tokens: List[str]) -> Iterable[str]:
+        """Replay a cached token sequence merged into STREAM_REPLAY_CHUNK_CHARS chunks, optionally paced"""
+        buffer = ""
+        sent = False
+        for token in tokens:
+            buffer += token
+            if len(buffer) >= STREAM_REPLAY_CHUNK_CHARS:
+                if sent and STREAM_REPLAY_DELAY_MS > 0:
+                    time.sleep(STREAM_REPLAY_DELAY_MS / 1000)
+                yield buffer
+                buffer = ""
+                sent = True
+        if buffer:
+            if sent and STREAM_REPLAY_DELAY_MS > 0:
+                time.sleep(STREAM_REPLAY_DELAY_MS / 1000)
+            yield buffer
     
     def get_status(self) -> Dict:
         """Get bot status and statistics"""
@@ -884,7 +1236,9 @@ If you have questions about current gold investment options in India or tax impl
         # Determine which AI model is being used
         model_name = None
         if self.llm:
-            if isinstance(self.llm, ChatGoogleGenerativeAI):
+            if isinstance(self.llm, FakeLLM):
+                model_name = "Fake LLM (deterministic, offline)"
+            elif isinstance(self.llm, ChatGoogleGenerativeAI):
                 model_name = "Google Gemini (gemini-1.5-flash)"
             else:
                 model_name = "OpenRouter (gpt-4o-mini)"
@@ -910,7 +1264,4 @@ def get_bot() -> ArthMitraBot:
 
 def initialize_bot(api_key: Optional[str] = None) -> ArthMitraBot:
     """Initialize and return the bot"""
-    bot = get_bot()
-    if not bot._initialized:
-        bot.initialize()
-    return bot
+    return get_bot().ensure_initialized()
@@ -0,0 +1,312 @@
+"""
+Structure-aware chunking for the knowledge base
+PDF pages are cleaned of repeated headers/footers, split on headings so chunks
+stay inside one section (stored as metadata), and near-identical chunks from
+boilerplate rule text are dropped with SimHash before embedding. CSV tables are
+grouped into summarized row blocks instead of one chunk per row.
+"""
+
+import hashlib
+import os
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+# Page furniture: lines in the top/bottom FURNITURE_LINES of a page that repeat on
+# at least FURNITURE_MIN_SHARE of pages (only page references like "Page 3 of 90" may differ)
+FURNITURE_LINES = 3
+FURNITURE_MIN_SHARE = 0.5
+FURNITURE_MIN_PAGES = 3
+
+# Headings: short lines that look like numbered clauses, chapter/section markers or all-caps titles
+MAX_HEADING_CHARS = 90
+HEADING_PATTERNS = (
+    re.compile(r"^(chapter|part|section|schedule|annex(ure)?|appendix)\b[\s\w.\-–:()]*$", re.IGNORECASE),
+    re.compile(r"^(\d{1,3}(\.\d{1,3}){0,3}|[ivxlc]+|[A-Z])[.)]\s+[A-Z][^.;:]{2,}$"),
+)
+# Gazette-style rules put the clause title inline: "5. Manner of making deposit. - (1) The account ..."
+INLINE_HEADING = re.compile(r"^\s*(\d{1,3}[A-Z]?\.\s+[A-Z][^.;:]{2,80}?)\s*\.\s*[-–—]")
+
+# Near-duplicate detection: 64-bit SimHash over word shingles
+SIMHASH_BITS = 64
+SIMHASH_SHINGLE = 3
+SIMHASH_MAX_DISTANCE = 3  # Bits; 4 bands of 16 bits guarantee candidates share a band
+SIMHASH_BANDS = 4
+
+# CSV blocks: rows grouped by the first matching column (a date column groups by year),
+# rendered under a schema header and split to stay within the embedding model's window
+CSV_GROUP_HINTS = ("fiscal_year", "financial_year", "year", "date", "category", "state")
+CSV_MAX_GROUPS = 100
+CSV_BLOCK_MAX_CHARS = 1000
+
+_FIELD_KEY = re.compile(r"^[a-z][a-z0-9_]*$")
+_WORDS = re.compile(r"\w+")
+_PAGE_NUMBER = re.compile(r"^\s*(page\s*)?\d+(\s*(of|/)\s*\d+)?\s*$", re.IGNORECASE)
+_PAGE_REFERENCE = re.compile(r"\bpage\s*\d+(\s*(of|/)\s*\d+)?", re.IGNORECASE)
+
+
+def _furniture_key(line: str) -> str:
+    return _PAGE_REFERENCE.sub("page #", line.strip().lower())
+
+
+def _edge_indexes(lines: List[str]) -> set:
+    """Indexes of the first and last FURNITURE_LINES non-empty lines of a page"""
+    non_empty = [index for index, line in enumerate(lines) if line.strip()]
+    return set(non_empty[:FURNITURE_LINES] + non_empty[-FURNITURE_LINES:])
+
+
+def strip_page_furniture(pages: List[Document]) -> List[Document]:
+    """Remove headers/footers repeated across pages and bare page numbers (page edges only)"""
+    page_lines = [page.page_content.splitlines() for page in pages]
+    page_edges = [_edge_indexes(lines) for lines in page_lines]
+
+    repeated = set()
+    if len(pages) >= FURNITURE_MIN_PAGES:
+        counts: Counter = Counter()
+        for lines, edges in zip(page_lines, page_edges):
+            counts.update({_furniture_key(lines[index]) for index in edges})
+        min_pages = max(FURNITURE_MIN_PAGES, int(len(pages) * FURNITURE_MIN_SHARE))
+        repeated = {key for key, count in counts.items() if count >= min_pages}
+
+    cleaned = []
+    for page, lines, edges in zip(pages, page_lines, page_edges):
+        kept = [
+            line for index, line in enumerate(lines)
+            if index not in edges or not (_PAGE_NUMBER.match(line) or _furniture_key(line) in repeated)
+        ]
+        cleaned.append(Document(page_content="\n".join(kept), metadata=dict(page.metadata)))
+    return cleaned
+
+
+def heading_title(line: str) -> Optional[str]:
+    """
+    Section title if the line starts a section: short numbered/marker lines,
+    ALL-CAPS titles, or an inline clause title at the start of a rule paragraph
+    """
+    inline = INLINE_HEADING.match(line)
+    if inline:
+        return inline.group(1).strip()
+
+    text = line.strip()
+    if not text or len(text) > MAX_HEADING_CHARS or text.endswith((",", ";")):
+        return None
+    letters = [char for char in text if char.isalpha()]
+    if len(letters) >= 4 and all(char.isupper() for char in letters) and len(text.split()) <= 12:
+        return text
+    if any(pattern.match(text) for pattern in HEADING_PATTERNS):
+        return text
+    return None
+
+
+def split_sections(pages: List[Document]) -> List[Document]:
+    """
+    Regroup page text into sections that start at headings.
+    Each section keeps the page it starts on and its heading as 'section'.
+    """
+    sections: List[Document] = []
+    title: Optional[str] = None
+    lines: List[str] = []
+    start_metadata: Dict = {}
+
+    def flush():
+        text = "\n".join(lines).strip()
+        if text:
+            metadata = dict(start_metadata)
+            if title:
+                metadata["section"] = title
+            sections.append(Document(page_content=text, metadata=metadata))
+
+    for page in pages:
+        for line in page.page_content.splitlines():
+            heading = heading_title(line)
+            if heading:
+                flush()
+                title, lines, start_metadata = heading, [line.strip()], page.metadata
+            else:
+                if not lines:
+                    start_metadata = page.metadata
+                lines.append(line)
+    flush()
+    return sections
+
+
+def pack_sections(sections: List[Document], max_chars: int, min_chars: int = 0) -> List[Document]:
+    """
+    Combine consecutive short sections (table rows, one-line clauses) up to max_chars
+    so they do not become tiny chunks; the pack keeps its first section's metadata.
+    Pieces under min_chars always join the previous pack (overshooting by at most min_chars).
+    """
+    packed: List[Document] = []
+    for section in sections:
+        previous = packed[-1] if packed else None
+        size = len(section.page_content)
+        if previous is not None and (
+            len(previous.page_content) + 1 + size <= max_chars or size < min_chars
+        ):
+            previous.page_content += "\n" + section.page_content
+        else:
+            packed.append(Document(page_content=section.page_content, metadata=dict(section.metadata)))
+    return packed
+
+
+def simhash(text: str) -> int:
+    """64-bit SimHash of word shingles"""
+    words = _WORDS.findall(text.lower())
+    shingles = [" ".join(words[i:i + SIMHASH_SHINGLE]) for i in range(max(1, len(words) - SIMHASH_SHINGLE + 1))]
+    weights = [0] * SIMHASH_BITS
+    for shingle in shingles:
+        value = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += 1 if value >> bit & 1 else -1
+    return sum(1 << bit for bit, weight in enumerate(weights) if weight > 0)
+
+
+def dedupe_chunks(chunks: Iterable[Document], max_distance: int = SIMHASH_MAX_DISTANCE) -> List[Document]:
+    """Drop chunks whose SimHash is within max_distance bits of an earlier chunk"""
+    band_bits = SIMHASH_BITS // SIMHASH_BANDS
+    band_mask = (1 << band_bits) - 1
+    buckets: Dict[tuple, List[int]] = {}
+    kept = []
+    for chunk in chunks:
+        fingerprint = simhash(chunk.page_content)
+        bands = [(band, fingerprint >> (band * band_bits) & band_mask) for band in range(SIMHASH_BANDS)]
+        candidates = {other for key in bands for other in buckets.get(key, ())}
+        if any(bin(fingerprint ^ other).count("1") <= max_distance for other in candidates):
+            continue
+        for key in bands:
+            buckets.setdefault(key, []).append(fingerprint)
+        kept.append(chunk)
+    return kept
+
+
+def chunk_ids(chunks: List[Document]) -> List[str]:
+    """
+    Deterministic vector IDs from source, position and text: re-indexing unchanged
+    content upserts the same IDs, and a document's vectors can be deleted exactly
+    """
+    ids = []
+    for position, chunk in enumerate(chunks):
+        key = f"{chunk.metadata.get('source', '')}\0{position}\0{chunk.page_content}"
+        ids.append(hashlib.sha256(key.encode("utf-8")).hexdigest()[:32])
+    return ids
+
+
+def chunk_pdf_pages(pages: List[Document], chunk_size: int, chunk_overlap: int) -> List[Document]:
+    """Clean, section-split, size-split and dedupe PyPDFLoader pages"""
+    sections = split_sections(strip_page_furniture(pages))
+    sections = pack_sections(sections, max_chars=chunk_size)
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        separators=["\n\n", "\n", ".", " "]
+    )
+    # Section tails left by the size split are packed with what follows
+    pieces = pack_sections(splitter.split_documents(sections), max_chars=chunk_size, min_chars=chunk_size // 3)
+    return dedupe_chunks(pieces)
+
+
+def _csv_group_keys(df: pd.DataFrame) -> Tuple[Optional[str], Optional[pd.Series]]:
+    """Column (label, keys) to group rows by, or (None, None) for one sequential run"""
+    for hint in CSV_GROUP_HINTS:
+        for column in df.columns:
+            if hint not in column.lower():
+                continue
+            if "date" in column.lower():
+                parsed = pd.to_datetime(df[column], errors="coerce", dayfirst=True)
+                if parsed.notna().mean() > 0.9:
+                    return f"{column} (year)", parsed.dt.year.astype("Int64").astype(str)
+                continue
+            if 1 < df[column].nunique() <= min(CSV_MAX_GROUPS, len(df) // 2):
+                return column, df[column]
+    for column in df.columns:
+        if 1 < df[column].nunique() <= min(CSV_MAX_GROUPS // 2, len(df) // 5):
+            return column, df[column]
+    return None, None
+
+
+def _numeric_summary(block: pd.DataFrame) -> str:
+    parts = []
+    for column in block.columns:
+        values = pd.to_numeric(block[column].replace("", None), errors="coerce")
+        if values.notna().sum() and values.notna().sum() == (block[column] != "").sum() and values.nunique() > 1:
+            parts.append(f"{column} min {values.min():g}, max {values.max():g}, mean {values.mean():.4g}")
+    return "; ".join(parts)
+
+
+def _table_blocks(name: str, columns: List[str], block: pd.DataFrame, group: Optional[str], total_rows: int, max_chars: int, metadata: Dict) -> List[Document]:
+    """Render one group of rows as header + varying columns, split to max_chars"""
+    constant = [column for column in block.columns if block[column].nunique() <= 1 and len(block) > 1]
+    varying = [column for column in block.columns if column not in constant]
+
+    header_lines = [f"Table: {name} | columns: {', '.join(columns)}"]
+    if group:
+        header_lines.append(f"Group: {group} | {len(block)} of {total_rows} rows")
+    fixed = "; ".join(f"{column}={block[column].iloc[0]}" for column in constant if block[column].iloc[0] != "")
+    if fixed:
+        header_lines.append(f"All rows: {fixed}")
+    summary = _numeric_summary(block[varying]) if len(block) > 1 else ""
+    if summary:
+        header_lines.append(f"Summary: {summary}")
+    header = "\n".join(header_lines)
+
+    rows = [
+        "; ".join(f"{column}={row[column]}" for column in varying if row[column] != "")
+        for _, row in block.iterrows()
+    ]
+    blocks, current, start = [], [], 0
+    for index, row_text in enumerate(rows):
+        if current and len(header) + sum(len(line) + 1 for line in current) + len(row_text) > max_chars:
+            blocks.append((start, current))
+            current, start = [], index
+        current.append(row_text)
+    if current:
+        blocks.append((start, current))
+
+    documents = []
+    for start, lines in blocks:
+        block_metadata = dict(metadata)
+        block_metadata.update({
+            "content_type": "table",
+            "columns": ", ".join(columns),
+            "row_start": int(block.index[start]),
+            "row_end": int(block.index[start + len(lines) - 1]),
+        })
+        if group:
+            block_metadata["section"] = group
+        documents.append(Document(page_content=header + "\nRows:\n" + "\n".join(lines), metadata=block_metadata))
+    return documents
+
+
+def _is_key_value(df: pd.DataFrame) -> bool:
+    """Headerless two-column field/value sheets such as the Dataful metadata.csv files"""
+    if len(df.columns) != 2 or len(df) > 50:
+        return False
+    keys = [str(df.columns[0])] + df.iloc[:, 0].tolist()
+    return all(_FIELD_KEY.match(key) for key in keys) and len(set(keys)) == len(keys)
+
+
+def chunk_csv(file_path: str, max_chars: int = CSV_BLOCK_MAX_CHARS) -> List[Document]:
+    """Group a CSV's rows (by year/category where possible) into schema-tagged summary blocks"""
+    df = pd.read_csv(file_path, dtype=str, keep_default_na=False, skipinitialspace=True)
+    if df.empty:
+        return []
+    name = os.path.basename(file_path)
+    columns = [str(column) for column in df.columns]
+    metadata = {"source": file_path}
+
+    if _is_key_value(df):
+        df = pd.read_csv(file_path, dtype=str, keep_default_na=False, skipinitialspace=True, header=None, names=["field", "value"])
+        return _table_blocks(name, ["field", "value"], df, None, len(df), max_chars, metadata)
+
+    group_label, keys = _csv_group_keys(df)
+    if keys is None:
+        return _table_blocks(name, columns, df, None, len(df), max_chars, metadata)
+
+    documents = []
+    for value, block in df.groupby(keys, sort=False):
+        documents.extend(_table_blocks(name, columns, block, f"{group_label} = {value}", len(df), max_chars, metadata))
+    return documents
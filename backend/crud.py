@@ -3,19 +3,70 @@ CRUD operations for database models
 """
 
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
-from typing import List, Optional, Dict
+from sqlalchemy import func, desc, asc, and_, or_, select, distinct, delete
+from sqlalchemy.dialects import sqlite, postgresql
+from typing import List, Optional, Dict, Tuple, Any
 from datetime import datetime, timedelta
-import bcrypt
+import base64
+import json
+import math
 
-from models import User, ChatSession, ChatMessage, Document, SavedMessage, Analytics
+from logging_config import get_logger
+from security import hash_password_sync, check_password_sync
+from profile_cache import profile_cache
+
+from models import (
+    User, ChatSession, ChatMessage, Document, SavedMessage, Analytics,
+    AnalyticsHourlyRollup, AnalyticsDailyRollup, AnalyticsDailyUser
+)
+
+logger = get_logger("crud")
+
+
+# ============= PAGINATION =============
+
+def encode_cursor(timestamp: datetime, row_id: Any) -> str:
+    """Encode the sort key of the last row on a page as an opaque cursor"""
+    payload = json.dumps([timestamp.isoformat(), row_id])
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, Any]:
+    """Decode a cursor back into (timestamp, id); raises ValueError if malformed"""
+    try:
+        timestamp, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return datetime.fromisoformat(timestamp), row_id
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def keyset_filter(time_column, id_column, cursor: str, descending: bool = True):
+    """Filter for rows strictly after the cursor in (time, id) order"""
+    timestamp, row_id = decode_cursor(cursor)
+    if descending:
+        return or_(time_column < timestamp, and_(time_column == timestamp, id_column < row_id))
+    return or_(time_column > timestamp, and_(time_column == timestamp, id_column > row_id))
+
+
+def keyset_order(time_column, id_column, descending: bool = True):
+    """Order clause matching keyset_filter"""
+    direction = desc if descending else asc
+    return direction(time_column), direction(id_column)
+
+
+def next_cursor(rows: List, limit: Optional[int], time_attr: str) -> Optional[str]:
+    """Cursor for the page after rows, or None when this was the last page"""
+    if not limit or len(rows) < limit:
+        return None
+    last = rows[-1]
+    return encode_cursor(getattr(last, time_attr), last.id)
 
 
 # ============= USER OPERATIONS =============
 
 def create_user(db: Session, email: str, username: str, password: str) -> User:
     """Create a new user with hashed password"""
-    password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    password_hash = hash_password_sync(password)
     
     user = User(
         email=email,
@@ -43,9 +94,21 @@ def get_user_by_id(db: Session, user_id: str) -> Optional[User]:
     return db.query(User).filter(User.id == user_id).first()
 
 
+def get_cached_user_profile(db: Session, user_id: str) -> Optional[Dict]:
+    """Get a user's cached profile entry, loading it from the database on a miss"""
+    entry = profile_cache.get(user_id)
+    if entry is None:
+        generation = profile_cache.generation()
+        user = get_user_by_id(db, user_id)
+        if not user:
+            return None
+        entry = profile_cache.set(user_id, user.to_dict(), generation)
+    return entry
+
+
 def verify_password(user: User, password: str) -> bool:
     """Verify user password"""
-    return bcrypt.checkpw(password.encode('utf-8'), user.password_hash.encode('utf-8'))
+    return check_password_sync(password, user.password_hash)
 
 
 def update_user_profile(db: Session, user_id: str, profile_data: Dict) -> Optional[User]:
@@ -85,6 +148,7 @@ def update_user_profile(db: Session, user_id: str, profile_data: Dict) -> Option
     user.updated_at = datetime.utcnow()
     db.commit()
     db.refresh(user)
+    profile_cache.invalidate(user_id)
     return user
 
 
@@ -94,6 +158,7 @@ def update_last_login(db: Session, user_id: str):
     if user:
         user.last_login = datetime.utcnow()
         db.commit()
+        profile_cache.invalidate(user_id)
 
 
 def change_password(db: Session, user_id: str, new_password: str) -> Optional[User]:
@@ -102,7 +167,7 @@ def change_password(db: Session, user_id: str, new_password: str) -> Optional[Us
     if not user:
         return None
     
-    password_hash = bcrypt.hashpw(new_password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    password_hash = hash_password_sync(new_password)
     user.password_hash = password_hash
     user.updated_at = datetime.utcnow()
     db.commit()
@@ -111,30 +176,33 @@ def change_password(db: Session, user_id: str, new_password: str) -> Optional[Us
 
 
 def delete_user(db: Session, user_id: str) -> bool:
-    """Delete user and all associated data"""
-    user = get_user_by_id(db, user_id)
-    if not user:
+    """Delete user and all associated data with set-based deletes in one transaction"""
+    if not db.query(User.id).filter(User.id == user_id).first():
         return False
     
     try:
-        # Delete all user's chat sessions and messages
-        sessions = db.query(ChatSession).filter(ChatSession.user_id == user_id).all()
-        for session in sessions:
-            db.query(ChatMessage).filter(ChatMessage.session_id == session.id).delete()
-            db.delete(session)
+        bulk = {"synchronize_session": False}
+        session_ids = select(ChatSession.id).where(ChatSession.user_id == user_id).scalar_subquery()
         
-        # Delete user's documents
-        db.query(Document).filter(Document.user_id == user_id).delete()
+        # Delete user's saved messages (they reference chat messages)
+        db.execute(delete(SavedMessage).where(SavedMessage.user_id == user_id), execution_options=bulk)
+        
+        # Delete all user's chat messages and sessions
+        db.execute(delete(ChatMessage).where(ChatMessage.session_id.in_(session_ids)), execution_options=bulk)
+        db.execute(delete(ChatSession).where(ChatSession.user_id == user_id), execution_options=bulk)
         
-        # Delete user's saved messages
-        db.query(SavedMessage).filter(SavedMessage.user_id == user_id).delete()
+        # Delete user's documents
+        db.execute(delete(Document).where(Document.user_id == user_id), execution_options=bulk)
         
         # Delete user's analytics
-        db.query(Analytics).filter(Analytics.user_id == user_id).delete()
+        db.execute(delete(Analytics).where(Analytics.user_id == user_id), execution_options=bulk)
+        db.execute(delete(AnalyticsDailyUser).where(AnalyticsDailyUser.user_id == user_id), execution_options=bulk)
         
         # Delete user
-        db.delete(user)
+        db.execute(delete(User).where(User.id == user_id), execution_options=bulk)
         db.commit()
+        profile_cache.invalidate(user_id)
+        db.expire_all()
         return True
     except Exception as e:
         db.rollback()
@@ -142,6 +210,14 @@ def delete_user(db: Session, user_id: str) -> bool:
         return False
 
 
+def count_user_messages(db: Session, user_id: str) -> int:
+    """Count all chat messages across a user's sessions"""
+    return db.query(func.count(ChatMessage.id))\
+        .join(ChatSession, ChatSession.id == ChatMessage.session_id)\
+        .filter(ChatSession.user_id == user_id)\
+        .scalar() or 0
+
+
 # ============= CHAT OPERATIONS =============
 
 def create_chat_session(db: Session, user_id: str, title: str = "New Chat") -> ChatSession:
@@ -165,6 +241,39 @@ def get_user_chat_sessions(db: Session, user_id: str, limit: int = 50) -> List[C
         .all()
 
 
+def get_user_chat_sessions_with_counts(
+    db: Session,
+    user_id: str,
+    limit: int = 50,
+    cursor: Optional[str] = None
+) -> List[Tuple[ChatSession, int]]:
+    """Get a page of user's chat sessions with message counts from a single GROUP BY subquery"""
+    # Only aggregate this user's messages, not the whole table
+    user_sessions = select(ChatSession.id).filter(ChatSession.user_id == user_id)
+    counts = db.query(
+        ChatMessage.session_id.label('session_id'),
+        func.count(ChatMessage.id).label('message_count')
+    ).filter(ChatMessage.session_id.in_(user_sessions))\
+        .group_by(ChatMessage.session_id).subquery()
+    
+    query = db.query(ChatSession, func.coalesce(counts.c.message_count, 0))\
+        .outerjoin(counts, counts.c.session_id == ChatSession.id)\
+        .filter(ChatSession.user_id == user_id)
+    if cursor:
+        query = query.filter(keyset_filter(ChatSession.updated_at, ChatSession.id, cursor))
+    rows = query.order_by(*keyset_order(ChatSession.updated_at, ChatSession.id))\
+        .limit(limit)\
+        .all()
+    return [(session, count) for session, count in rows]
+
+
+def count_session_messages(db: Session, session_id: str) -> int:
+    """Count messages in a session without loading them"""
+    return db.query(func.count(ChatMessage.id))\
+        .filter(ChatMessage.session_id == session_id)\
+        .scalar() or 0
+
+
 def get_chat_session(db: Session, session_id: str) -> Optional[ChatSession]:
     """Get a specific chat session"""
     return db.query(ChatSession).filter(ChatSession.id == session_id).first()
@@ -177,18 +286,29 @@ def create_chat_message(
     content: str,
     sources: Optional[List[str]] = None,
     response_time: Optional[float] = None,
-    cached: bool = False
+    cached: bool = False,
+    tokens_used: Optional[int] = None,
+    timings: Optional[Dict] = None
 ) -> ChatMessage:
     """Create a new chat message"""
+    now = datetime.utcnow()
     message = ChatMessage(
         session_id=session_id,
         role=role,
         content=content,
         sources=sources,
         response_time=response_time,
-        cached=cached
+        cached=cached,
+        tokens_used=tokens_used,
+        timings=timings,
+        created_at=now
     )
     db.add(message)
+    for stmt in rollup_statements(
+        db.get_bind().dialect.name, message_event_type(role), now,
+        response_time=response_time, cached=cached
+    ):
+        db.execute(stmt)
     
     # Update session timestamp
     session = get_chat_session(db, session_id)
@@ -204,12 +324,20 @@ def create_chat_message(
     return message
 
 
-def get_session_messages(db: Session, session_id: str) -> List[ChatMessage]:
-    """Get all messages in a session"""
-    return db.query(ChatMessage)\
-        .filter(ChatMessage.session_id == session_id)\
-        .order_by(ChatMessage.created_at)\
-        .all()
+def get_session_messages(
+    db: Session,
+    session_id: str,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None
+) -> List[ChatMessage]:
+    """Get messages in a session, oldest first, optionally one page after cursor"""
+    query = db.query(ChatMessage).filter(ChatMessage.session_id == session_id)
+    if cursor:
+        query = query.filter(keyset_filter(ChatMessage.created_at, ChatMessage.id, cursor, descending=False))
+    query = query.order_by(*keyset_order(ChatMessage.created_at, ChatMessage.id, descending=False))
+    if limit:
+        query = query.limit(limit)
+    return query.all()
 
 
 def delete_chat_session(db: Session, session_id: str) -> bool:
@@ -243,7 +371,9 @@ def create_document(
     file_path: str,
     file_type: str,
     file_size: int,
-    chunks_indexed: int = 0
+    chunks_indexed: int = 0,
+    content_hash: Optional[str] = None,
+    chunk_ids: Optional[List[str]] = None
 ) -> Document:
     """Create a new document record"""
     document = Document(
@@ -252,7 +382,9 @@ def create_document(
         file_path=file_path,
         file_type=file_type,
         file_size=file_size,
+        content_hash=content_hash,
         chunks_indexed=chunks_indexed,
+        chunk_ids=chunk_ids,
         is_indexed=chunks_indexed > 0
     )
     db.add(document)
@@ -261,12 +393,85 @@ def create_document(
     return document
 
 
-def get_user_documents(db: Session, user_id: str) -> List[Document]:
-    """Get all documents for a user"""
-    return db.query(Document)\
-        .filter(Document.user_id == user_id)\
-        .order_by(desc(Document.uploaded_at))\
-        .all()
+def get_user_document_by_hash(db: Session, user_id: str, content_hash: str) -> Optional[Document]:
+    """The user's existing reference to this content, if any"""
+    return db.query(Document).filter(
+        Document.user_id == user_id, Document.content_hash == content_hash
+    ).first()
+
+
+def get_indexed_document_by_hash(db: Session, content_hash: str) -> Optional[Document]:
+    """Any user's indexed copy of this content (its chunks can be shared)"""
+    return db.query(Document).filter(
+        Document.content_hash == content_hash, Document.is_indexed == True
+    ).first()
+
+
+def mark_document_indexed(
+    db: Session,
+    document_id: str,
+    chunks_indexed: int,
+    chunk_ids: Optional[List[str]] = None
+) -> int:
+    """
+    Record the result of an indexing job on a document and every other
+    reference to the same content. Returns the number of rows updated.
+    """
+    document = db.query(Document).filter(Document.id == document_id).first()
+    if not document:
+        return 0
+    documents = [document]
+    if document.content_hash:
+        documents = db.query(Document).filter(Document.content_hash == document.content_hash).all()
+    for row in documents:
+        row.chunks_indexed = chunks_indexed
+        row.is_indexed = chunks_indexed > 0
+        if chunk_ids is not None:
+            row.chunk_ids = chunk_ids
+    db.commit()
+    return len(documents)
+
+
+def count_content_references(db: Session, content_hash: str) -> int:
+    """Document rows (across users) that share this content"""
+    return db.query(Document).filter(Document.content_hash == content_hash).count()
+
+
+def delete_document(db: Session, document_id: str) -> bool:
+    """Delete a document record (vectors are removed by the caller)"""
+    document = db.query(Document).filter(Document.id == document_id).first()
+    if document:
+        db.delete(document)
+        db.commit()
+        return True
+    return False
+
+
+def get_chunk_references(db: Session) -> Dict[str, set]:
+    """
+    Chunk IDs referenced by document rows, per stored file path. Rows indexed
+    before chunk IDs were recorded map their path to an empty set.
+    """
+    references: Dict[str, set] = {}
+    for ids, file_path in db.query(Document.chunk_ids, Document.file_path):
+        references.setdefault(file_path, set()).update(ids or [])
+    return references
+
+
+def get_user_documents(
+    db: Session,
+    user_id: str,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None
+) -> List[Document]:
+    """Get documents for a user, newest first, optionally one page after cursor"""
+    query = db.query(Document).filter(Document.user_id == user_id)
+    if cursor:
+        query = query.filter(keyset_filter(Document.uploaded_at, Document.id, cursor))
+    query = query.order_by(*keyset_order(Document.uploaded_at, Document.id))
+    if limit:
+        query = query.limit(limit)
+    return query.all()
 
 
 def get_document(db: Session, document_id: str) -> Optional[Document]:
@@ -298,12 +503,20 @@ def save_message(
     return saved
 
 
-def get_user_saved_messages(db: Session, user_id: str) -> List[SavedMessage]:
-    """Get all saved messages for a user"""
-    return db.query(SavedMessage)\
-        .filter(SavedMessage.user_id == user_id)\
-        .order_by(desc(SavedMessage.saved_at))\
-        .all()
+def get_user_saved_messages(
+    db: Session,
+    user_id: str,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None
+) -> List[SavedMessage]:
+    """Get saved messages for a user, newest first, optionally one page after cursor"""
+    query = db.query(SavedMessage).filter(SavedMessage.user_id == user_id)
+    if cursor:
+        query = query.filter(keyset_filter(SavedMessage.saved_at, SavedMessage.id, cursor))
+    query = query.order_by(*keyset_order(SavedMessage.saved_at, SavedMessage.id))
+    if limit:
+        query = query.limit(limit)
+    return query.all()
 
 
 def delete_saved_message(db: Session, saved_id: str) -> bool:
@@ -320,78 +533,211 @@ def delete_saved_message(db: Session, saved_id: str) -> bool:
 
 def log_event(db: Session, user_id: Optional[str], event_type: str, event_data: Optional[Dict] = None):
     """Log an analytics event"""
+    now = datetime.utcnow()
     event = Analytics(
         user_id=user_id,
         event_type=event_type,
-        event_data=event_data
+        event_data=event_data,
+        timestamp=now
     )
     db.add(event)
+    for stmt in rollup_statements(db.get_bind().dialect.name, event_type, now, user_id=user_id):
+        db.execute(stmt)
     db.commit()
 
 
-def get_user_analytics(db: Session, user_id: str, days: int = 30) -> List[Analytics]:
-    """Get analytics for a specific user"""
+def get_user_analytics(
+    db: Session,
+    user_id: str,
+    days: int = 30,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None
+) -> List[Analytics]:
+    """Get analytics for a specific user, newest first, optionally one page after cursor"""
     since = datetime.utcnow() - timedelta(days=days)
-    return db.query(Analytics)\
-        .filter(Analytics.user_id == user_id, Analytics.timestamp >= since)\
-        .order_by(desc(Analytics.timestamp))\
-        .all()
+    query = db.query(Analytics)\
+        .filter(Analytics.user_id == user_id, Analytics.timestamp >= since)
+    if cursor:
+        query = query.filter(keyset_filter(Analytics.timestamp, Analytics.id, cursor))
+    query = query.order_by(*keyset_order(Analytics.timestamp, Analytics.id))
+    if limit:
+        query = query.limit(limit)
+    return query.all()
 
 
-def get_analytics_summary(db: Session, days: int = 7) -> Dict:
-    """Get overall analytics summary"""
-    since = datetime.utcnow() - timedelta(days=days)
-    
-    # Total queries
-    total_queries = db.query(Analytics)\
-        .filter(Analytics.event_type == 'query', Analytics.timestamp >= since)\
-        .count()
-    
-    # Total uploads
-    total_uploads = db.query(Analytics)\
-        .filter(Analytics.event_type == 'upload', Analytics.timestamp >= since)\
-        .count()
-    
-    # Active users
-    active_users = db.query(Analytics.user_id)\
-        .filter(Analytics.timestamp >= since)\
-        .distinct()\
-        .count()
-    
+# ============= ANALYTICS ROLLUPS =============
+# Event writes bump hourly and daily counters so dashboard reads never scan raw events.
+# A window is served from hourly buckets up to the first midnight, then daily buckets.
+
+MESSAGE_EVENT_PREFIX = "chat_message:"
+
+
+def message_event_type(role: str) -> str:
+    """Rollup key for chat messages of a role"""
+    return f"{MESSAGE_EVENT_PREFIX}{role}"
+
+
+def _floor_hour(timestamp: datetime) -> datetime:
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+
+def _floor_day(timestamp: datetime) -> datetime:
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _upsert(dialect_name: str):
+    """Dialect-specific INSERT supporting ON CONFLICT (SQLite and PostgreSQL only)"""
+    if dialect_name == "postgresql":
+        return postgresql.insert
+    if dialect_name == "sqlite":
+        return sqlite.insert
+    raise NotImplementedError(
+        f"Analytics rollups need INSERT ... ON CONFLICT; database dialect '{dialect_name}' is not supported "
+        "(use SQLite or PostgreSQL)"
+    )
+
+
+def rollup_statements(
+    dialect_name: str,
+    event_type: str,
+    timestamp: datetime,
+    user_id: Optional[str] = None,
+    response_time: Optional[float] = None,
+    cached: bool = False
+) -> List:
+    """Upsert statements that add one event to the hourly and daily rollups"""
+    insert = _upsert(dialect_name)
+    statements = []
+    for model, bucket in (
+        (AnalyticsHourlyRollup, _floor_hour(timestamp)),
+        (AnalyticsDailyRollup, _floor_day(timestamp)),
+    ):
+        stmt = insert(model).values(
+            bucket_start=bucket,
+            event_type=event_type,
+            event_count=1,
+            response_time_sum=response_time or 0.0,
+            response_time_count=1 if response_time is not None else 0,
+            cached_count=1 if cached else 0
+        )
+        statements.append(stmt.on_conflict_do_update(
+            index_elements=[model.bucket_start, model.event_type],
+            set_={
+                "event_count": model.event_count + stmt.excluded.event_count,
+                "response_time_sum": model.response_time_sum + stmt.excluded.response_time_sum,
+                "response_time_count": model.response_time_count + stmt.excluded.response_time_count,
+                "cached_count": model.cached_count + stmt.excluded.cached_count,
+            }
+        ))
+    if user_id:
+        statements.append(
+            insert(AnalyticsDailyUser)
+            .values(day=_floor_day(timestamp), user_id=user_id)
+            .on_conflict_do_nothing()
+        )
+    return statements
+
+
+def rollup_window_statements(since: datetime) -> List:
+    """Statements summing rollup counters per event type over [since, now]"""
+    first_day = _floor_day(since)
+    if first_day < since:
+        first_day += timedelta(days=1)
+
+    def totals(model, start, end=None):
+        stmt = select(
+            model.event_type,
+            func.sum(model.event_count),
+            func.sum(model.response_time_sum),
+            func.sum(model.response_time_count),
+            func.sum(model.cached_count)
+        ).filter(model.bucket_start >= start)
+        if end is not None:
+            stmt = stmt.filter(model.bucket_start < end)
+        return stmt.group_by(model.event_type)
+
+    return [
+        totals(AnalyticsHourlyRollup, _floor_hour(since), first_day),
+        totals(AnalyticsDailyRollup, first_day),
+    ]
+
+
+def active_users_statement(since: datetime):
+    """Distinct active users from the per-day user rollup"""
+    return select(func.count(distinct(AnalyticsDailyUser.user_id)))\
+        .filter(AnalyticsDailyUser.day >= _floor_day(since))
+
+
+def distribution_statements(since: datetime) -> List:
+    """Statements returning (bucket_start, count) of user messages over [since, now]"""
+    first_day = _floor_day(since)
+    if first_day < since:
+        first_day += timedelta(days=1)
+    event_type = message_event_type('user')
+    return [
+        select(AnalyticsHourlyRollup.bucket_start, AnalyticsHourlyRollup.event_count)
+        .filter(
+            AnalyticsHourlyRollup.event_type == event_type,
+            AnalyticsHourlyRollup.bucket_start >= _floor_hour(since),
+            AnalyticsHourlyRollup.bucket_start < first_day
+        ),
+        select(AnalyticsDailyRollup.bucket_start, AnalyticsDailyRollup.event_count)
+        .filter(
+            AnalyticsDailyRollup.event_type == event_type,
+            AnalyticsDailyRollup.bucket_start >= first_day
+        ),
+    ]
+
+
+def merge_rollup_totals(result_sets: List[List]) -> Dict[str, Dict]:
+    """Combine per-event-type rows from several rollup window statements"""
+    totals: Dict[str, Dict] = {}
+    for rows in result_sets:
+        for event_type, count, rt_sum, rt_count, cached in rows:
+            entry = totals.setdefault(event_type, {"count": 0, "rt_sum": 0.0, "rt_count": 0, "cached": 0})
+            entry["count"] += count or 0
+            entry["rt_sum"] += rt_sum or 0.0
+            entry["rt_count"] += rt_count or 0
+            entry["cached"] += cached or 0
+    return totals
+
+
+def build_analytics_summary(totals: Dict[str, Dict], active_users: int, days: int) -> Dict:
+    """Shape rollup totals into the analytics summary response"""
+    def count(event_type):
+        return totals.get(event_type, {}).get("count", 0)
+
+    total_queries = count('query')
+    total_uploads = count('upload')
+
     # Top queries (most common)
-    top_events = db.query(
-        Analytics.event_type,
-        func.count(Analytics.id).label('count')
-    ).filter(Analytics.timestamp >= since)\
-        .group_by(Analytics.event_type)\
-        .order_by(desc('count'))\
-        .limit(10)\
-        .all()
-    
+    top_events = sorted(
+        ((event_type, entry["count"]) for event_type, entry in totals.items()
+         if not event_type.startswith(MESSAGE_EVENT_PREFIX)),
+        key=lambda item: item[1],
+        reverse=True
+    )[:10]
+
     # Average response time
-    avg_response_time = db.query(func.avg(ChatMessage.response_time))\
-        .filter(ChatMessage.created_at >= since, ChatMessage.response_time.isnot(None))\
-        .scalar()
-    
+    message_totals = [entry for event_type, entry in totals.items() if event_type.startswith(MESSAGE_EVENT_PREFIX)]
+    rt_count = sum(entry["rt_count"] for entry in message_totals)
+    avg_response_time = sum(entry["rt_sum"] for entry in message_totals) / rt_count if rt_count else 0
+
     # Cache hit rate
-    total_responses = db.query(ChatMessage)\
-        .filter(ChatMessage.created_at >= since, ChatMessage.role == 'assistant')\
-        .count()
-    cached_responses = db.query(ChatMessage)\
-        .filter(ChatMessage.created_at >= since, ChatMessage.role == 'assistant', ChatMessage.cached == True)\
-        .count()
-    
+    assistant = totals.get(message_event_type('assistant'), {})
+    total_responses = assistant.get("count", 0)
+    cached_responses = assistant.get("cached", 0)
     cache_hit_rate = (cached_responses / total_responses * 100) if total_responses > 0 else 0
-    
+
     # Estimated tax saved (₹ per user per query)
     # Average assumption: ₹20,000 tax savings per user query
     estimated_tax_per_query = 20000
     total_tax_saved = total_queries * estimated_tax_per_query
-    
+
     return {
         "totalQueries": total_queries,
         "totalUploads": total_uploads,
-        "activeUsers": active_users,
+        "activeUsers": active_users or 0,
         "totalTaxSaved": total_tax_saved,
         "topEvents": [{"type": event[0], "count": event[1]} for event in top_events],
         "avgResponseTime": round(avg_response_time, 2) if avg_response_time else 0,
@@ -400,21 +746,142 @@ def get_analytics_summary(db: Session, days: int = 7) -> Dict:
     }
 
 
-def get_query_distribution(db: Session, days: int = 7) -> Dict:
-    """Get query distribution by date"""
-    since = datetime.utcnow() - timedelta(days=days)
-    
-    queries_by_date = db.query(
-        func.date(ChatMessage.created_at).label('date'),
-        func.count(ChatMessage.id).label('count')
-    ).filter(
-        ChatMessage.created_at >= since,
-        ChatMessage.role == 'user'
-    ).group_by(func.date(ChatMessage.created_at))\
-        .order_by('date')\
-        .all()
-    
+def build_query_distribution(rows: List) -> Dict:
+    """Sum (bucket_start, count) rows into per-date counts"""
+    by_date: Dict[str, int] = {}
+    for bucket_start, count in rows:
+        date = bucket_start.date().isoformat()
+        by_date[date] = by_date.get(date, 0) + count
+    dates = sorted(by_date)
+    return {
+        "dates": dates,
+        "counts": [by_date[date] for date in dates]
+    }
+
+
+# ============= LATENCY BREAKDOWN =============
+
+LATENCY_SAMPLE_LIMIT = 5000  # Most recent assistant messages considered per request
+
+
+def latency_samples_statement(since: datetime, limit: int = LATENCY_SAMPLE_LIMIT):
+    """Recent assistant messages' total response time and per-stage timings"""
+    return select(ChatMessage.response_time, ChatMessage.timings)\
+        .filter(
+            ChatMessage.role == 'assistant',
+            ChatMessage.created_at >= since,
+            ChatMessage.timings.isnot(None)
+        )\
+        .order_by(desc(ChatMessage.created_at))\
+        .limit(limit)
+
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an ascending list"""
+    index = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return round(sorted_values[index], 2)
+
+
+def build_latency_percentiles(rows: List, days: int) -> Dict:
+    """p50/p95/p99 (ms) per stage from (response_time, timings) rows"""
+    samples: Dict[str, List[float]] = {}
+    for response_time, timings in rows:
+        if response_time is not None:
+            samples.setdefault("total", []).append(response_time * 1000)
+        for stage, value in (timings or {}).items():
+            if isinstance(value, (int, float)):
+                samples.setdefault(stage, []).append(float(value))
+
+    stages = {}
+    for stage, values in samples.items():
+        values.sort()
+        stages[stage] = {
+            "count": len(values),
+            "p50": _percentile(values, 50),
+            "p95": _percentile(values, 95),
+            "p99": _percentile(values, 99),
+        }
     return {
-        "dates": [str(q[0]) for q in queries_by_date],
-        "counts": [q[1] for q in queries_by_date]
+        "stages": stages,
+        "samples": len(rows),
+        "period": f"Last {days} days"
     }
+
+
+def get_latency_percentiles(db: Session, days: int = 7) -> Dict:
+    """Per-stage latency percentiles for recent chat responses"""
+    since = datetime.utcnow() - timedelta(days=days)
+    return build_latency_percentiles(db.execute(latency_samples_statement(since)).all(), days)
+
+
+def rebuild_analytics_rollups(db: Session) -> int:
+    """Recompute all rollups from raw Analytics and ChatMessage rows (backfill/repair)"""
+    db.query(AnalyticsHourlyRollup).delete()
+    db.query(AnalyticsDailyRollup).delete()
+    db.query(AnalyticsDailyUser).delete()
+
+    buckets: Dict[Tuple, Dict] = {}
+    users = set()
+
+    def add(event_type, timestamp, response_time=None, cached=False):
+        for model, bucket in (
+            (AnalyticsHourlyRollup, _floor_hour(timestamp)),
+            (AnalyticsDailyRollup, _floor_day(timestamp)),
+        ):
+            entry = buckets.setdefault((model, bucket, event_type), {
+                "event_count": 0, "response_time_sum": 0.0, "response_time_count": 0, "cached_count": 0
+            })
+            entry["event_count"] += 1
+            if response_time is not None:
+                entry["response_time_sum"] += response_time
+                entry["response_time_count"] += 1
+            if cached:
+                entry["cached_count"] += 1
+
+    events = 0
+    for user_id, event_type, timestamp in db.query(Analytics.user_id, Analytics.event_type, Analytics.timestamp).yield_per(1000):
+        if timestamp is None:
+            continue
+        add(event_type, timestamp)
+        if user_id:
+            users.add((_floor_day(timestamp), user_id))
+        events += 1
+    for role, created_at, response_time, cached in db.query(
+        ChatMessage.role, ChatMessage.created_at, ChatMessage.response_time, ChatMessage.cached
+    ).yield_per(1000):
+        if created_at is None:
+            continue
+        add(message_event_type(role), created_at, response_time, cached)
+        events += 1
+
+    for (model, bucket, event_type), values in buckets.items():
+        db.add(model(bucket_start=bucket, event_type=event_type, **values))
+    for day, user_id in users:
+        db.add(AnalyticsDailyUser(day=day, user_id=user_id))
+    db.commit()
+    return events
+
+
+def ensure_analytics_rollups(db: Session) -> None:
+    """Backfill rollups once for databases created before they existed"""
+    has_rollups = db.query(AnalyticsDailyRollup.bucket_start).first() is not None
+    has_raw = db.query(Analytics.id).first() is not None or db.query(ChatMessage.id).first() is not None
+    if not has_rollups and has_raw:
+        logger.info("Backfilling analytics rollups")
+        events = rebuild_analytics_rollups(db)
+        logger.info("Analytics rollups backfilled", extra={"events": events})
+
+
+def get_analytics_summary(db: Session, days: int = 7) -> Dict:
+    """Get overall analytics summary from rollup tables"""
+    since = datetime.utcnow() - timedelta(days=days)
+    totals = merge_rollup_totals([db.execute(stmt).all() for stmt in rollup_window_statements(since)])
+    active_users = db.execute(active_users_statement(since)).scalar()
+    return build_analytics_summary(totals, active_users, days)
+
+
+def get_query_distribution(db: Session, days: int = 7) -> Dict:
+    """Get query distribution by date from rollup tables"""
+    since = datetime.utcnow() - timedelta(days=days)
+    rows = [row for stmt in distribution_statements(since) for row in db.execute(stmt).all()]
+    return build_query_distribution(rows)
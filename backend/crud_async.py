@@ -0,0 +1,333 @@
+"""
+Async CRUD operations for database models
+Mirrors crud.py for endpoints served on the event loop with AsyncSession
+"""
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func, desc
+from typing import List, Optional, Dict, Tuple
+from datetime import datetime, timedelta
+
+from models import User, ChatSession, ChatMessage, SavedMessage, Analytics
+from crud import (
+    keyset_filter, keyset_order, message_event_type, rollup_statements, rollup_window_statements,
+    active_users_statement, distribution_statements, merge_rollup_totals,
+    build_analytics_summary, build_query_distribution,
+    latency_samples_statement, build_latency_percentiles
+)
+import security
+from profile_cache import profile_cache
+
+
+# ============= USER OPERATIONS =============
+
+async def create_user(db: AsyncSession, email: str, username: str, password: str) -> User:
+    """Create a new user, hashing the password on the worker pool"""
+    password_hash = await security.hash_password(password)
+
+    user = User(
+        email=email,
+        username=username,
+        password_hash=password_hash
+    )
+    db.add(user)
+    await db.commit()
+    return user
+
+
+async def get_user_by_email(db: AsyncSession, email: str) -> Optional[User]:
+    """Get user by email"""
+    result = await db.execute(select(User).filter(User.email == email))
+    return result.scalars().first()
+
+
+async def get_user_by_username(db: AsyncSession, username: str) -> Optional[User]:
+    """Get user by username"""
+    result = await db.execute(select(User).filter(User.username == username))
+    return result.scalars().first()
+
+
+async def get_user_by_id(db: AsyncSession, user_id: str) -> Optional[User]:
+    """Get user by ID"""
+    return await db.get(User, user_id)
+
+
+async def verify_password(user: User, password: str) -> bool:
+    """Verify user password on the worker pool"""
+    return await security.check_password(password, user.password_hash)
+
+
+async def rehash_password_if_needed(db: AsyncSession, user: User, password: str) -> bool:
+    """Re-hash a verified password when its bcrypt cost differs from BCRYPT_ROUNDS"""
+    if not security.needs_rehash(user.password_hash):
+        return False
+    user.password_hash = await security.hash_password(password)
+    await db.commit()
+    return True
+
+
+async def update_last_login(db: AsyncSession, user_id: str):
+    """Update user's last login time"""
+    user = await get_user_by_id(db, user_id)
+    if user:
+        user.last_login = datetime.utcnow()
+        await db.commit()
+        profile_cache.invalidate(user_id)
+
+
+async def change_password(db: AsyncSession, user_id: str, new_password: str) -> Optional[User]:
+    """Change user password"""
+    user = await get_user_by_id(db, user_id)
+    if not user:
+        return None
+
+    user.password_hash = await security.hash_password(new_password)
+    user.updated_at = datetime.utcnow()
+    await db.commit()
+    return user
+
+
+# ============= CHAT OPERATIONS =============
+
+async def create_chat_session(db: AsyncSession, user_id: str, title: str = "New Chat") -> ChatSession:
+    """Create a new chat session"""
+    session = ChatSession(
+        user_id=user_id,
+        title=title
+    )
+    db.add(session)
+    await db.commit()
+    return session
+
+
+async def get_user_chat_sessions_with_counts(
+    db: AsyncSession,
+    user_id: str,
+    limit: int = 50,
+    cursor: Optional[str] = None
+) -> List[Tuple[ChatSession, int]]:
+    """Get a page of user's chat sessions with message counts from a single GROUP BY subquery"""
+    counts = (
+        select(
+            ChatMessage.session_id.label('session_id'),
+            func.count(ChatMessage.id).label('message_count')
+        )
+        # Only aggregate this user's messages, not the whole table
+        .filter(ChatMessage.session_id.in_(select(ChatSession.id).filter(ChatSession.user_id == user_id)))
+        .group_by(ChatMessage.session_id)
+        .subquery()
+    )
+    stmt = (
+        select(ChatSession, func.coalesce(counts.c.message_count, 0))
+        .outerjoin(counts, counts.c.session_id == ChatSession.id)
+        .filter(ChatSession.user_id == user_id)
+    )
+    if cursor:
+        stmt = stmt.filter(keyset_filter(ChatSession.updated_at, ChatSession.id, cursor))
+    result = await db.execute(
+        stmt.order_by(*keyset_order(ChatSession.updated_at, ChatSession.id)).limit(limit)
+    )
+    return [(session, count) for session, count in result.all()]
+
+
+async def count_session_messages(db: AsyncSession, session_id: str) -> int:
+    """Count messages in a session without loading them"""
+    count = await db.scalar(
+        select(func.count(ChatMessage.id)).filter(ChatMessage.session_id == session_id)
+    )
+    return count or 0
+
+
+async def get_chat_session(db: AsyncSession, session_id: str) -> Optional[ChatSession]:
+    """Get a specific chat session"""
+    return await db.get(ChatSession, session_id)
+
+
+async def create_chat_message(
+    db: AsyncSession,
+    session_id: str,
+    role: str,
+    content: str,
+    sources: Optional[List[str]] = None,
+    response_time: Optional[float] = None,
+    cached: bool = False,
+    tokens_used: Optional[int] = None,
+    timings: Optional[Dict] = None
+) -> ChatMessage:
+    """Create a new chat message"""
+    now = datetime.utcnow()
+    message = ChatMessage(
+        session_id=session_id,
+        role=role,
+        content=content,
+        sources=sources,
+        response_time=response_time,
+        cached=cached,
+        tokens_used=tokens_used,
+        timings=timings,
+        created_at=now
+    )
+    db.add(message)
+    for stmt in rollup_statements(
+        db.get_bind().dialect.name, message_event_type(role), now,
+        response_time=response_time, cached=cached
+    ):
+        await db.execute(stmt)
+
+    # Update session timestamp
+    session = await db.get(ChatSession, session_id)
+    if session:
+        session.updated_at = datetime.utcnow()
+        # Auto-generate title from first user message
+        if not session.title or session.title == "New Chat":
+            if role == "user" and content:
+                session.title = content[:50] + "..." if len(content) > 50 else content
+
+    await db.commit()
+    return message
+
+
+async def get_session_messages(
+    db: AsyncSession,
+    session_id: str,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None
+) -> List[ChatMessage]:
+    """Get messages in a session, oldest first, optionally one page after cursor"""
+    stmt = select(ChatMessage).filter(ChatMessage.session_id == session_id)
+    if cursor:
+        stmt = stmt.filter(keyset_filter(ChatMessage.created_at, ChatMessage.id, cursor, descending=False))
+    stmt = stmt.order_by(*keyset_order(ChatMessage.created_at, ChatMessage.id, descending=False))
+    if limit:
+        stmt = stmt.limit(limit)
+    result = await db.execute(stmt)
+    return list(result.scalars().all())
+
+
+async def delete_chat_session(db: AsyncSession, session_id: str) -> bool:
+    """Delete a chat session and all its messages"""
+    session = await get_chat_session(db, session_id)
+    if session:
+        await db.delete(session)
+        await db.commit()
+        return True
+    return False
+
+
+async def update_chat_session_title(db: AsyncSession, session_id: str, title: str) -> Optional[ChatSession]:
+    """Update the title of a chat session"""
+    session = await get_chat_session(db, session_id)
+    if session:
+        session.title = title
+        session.updated_at = datetime.utcnow()
+        await db.commit()
+        return session
+    return None
+
+
+# ============= SAVED MESSAGES =============
+
+async def save_message(
+    db: AsyncSession,
+    user_id: str,
+    message_id: str,
+    content: str,
+    note: Optional[str] = None,
+    tags: Optional[List[str]] = None
+) -> SavedMessage:
+    """Save a message for later reference"""
+    saved = SavedMessage(
+        user_id=user_id,
+        message_id=message_id,
+        content=content,
+        note=note,
+        tags=tags
+    )
+    db.add(saved)
+    await db.commit()
+    return saved
+
+
+async def get_user_saved_messages(
+    db: AsyncSession,
+    user_id: str,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None
+) -> List[SavedMessage]:
+    """Get saved messages for a user, newest first, optionally one page after cursor"""
+    stmt = select(SavedMessage).filter(SavedMessage.user_id == user_id)
+    if cursor:
+        stmt = stmt.filter(keyset_filter(SavedMessage.saved_at, SavedMessage.id, cursor))
+    stmt = stmt.order_by(*keyset_order(SavedMessage.saved_at, SavedMessage.id))
+    if limit:
+        stmt = stmt.limit(limit)
+    result = await db.execute(stmt)
+    return list(result.scalars().all())
+
+
+async def delete_saved_message(db: AsyncSession, saved_id: str) -> bool:
+    """Delete a saved message"""
+    saved = await db.get(SavedMessage, saved_id)
+    if saved:
+        await db.delete(saved)
+        await db.commit()
+        return True
+    return False
+
+
+# ============= ANALYTICS =============
+
+async def log_event(db: AsyncSession, user_id: Optional[str], event_type: str, event_data: Optional[Dict] = None):
+    """Log an analytics event"""
+    now = datetime.utcnow()
+    event = Analytics(
+        user_id=user_id,
+        event_type=event_type,
+        event_data=event_data,
+        timestamp=now
+    )
+    db.add(event)
+    for stmt in rollup_statements(db.get_bind().dialect.name, event_type, now, user_id=user_id):
+        await db.execute(stmt)
+    await db.commit()
+
+
+async def get_user_analytics(
+    db: AsyncSession,
+    user_id: str,
+    days: int = 30,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None
+) -> List[Analytics]:
+    """Get analytics for a specific user, newest first, optionally one page after cursor"""
+    since = datetime.utcnow() - timedelta(days=days)
+    stmt = select(Analytics).filter(Analytics.user_id == user_id, Analytics.timestamp >= since)
+    if cursor:
+        stmt = stmt.filter(keyset_filter(Analytics.timestamp, Analytics.id, cursor))
+    stmt = stmt.order_by(*keyset_order(Analytics.timestamp, Analytics.id))
+    if limit:
+        stmt = stmt.limit(limit)
+    result = await db.execute(stmt)
+    return list(result.scalars().all())
+
+
+async def get_analytics_summary(db: AsyncSession, days: int = 7) -> Dict:
+    """Get overall analytics summary from rollup tables"""
+    since = datetime.utcnow() - timedelta(days=days)
+    totals = merge_rollup_totals([(await db.execute(stmt)).all() for stmt in rollup_window_statements(since)])
+    active_users = await db.scalar(active_users_statement(since))
+    return build_analytics_summary(totals, active_users, days)
+
+
+async def get_query_distribution(db: AsyncSession, days: int = 7) -> Dict:
+    """Get query distribution by date from rollup tables"""
+    since = datetime.utcnow() - timedelta(days=days)
+    rows = [row for stmt in distribution_statements(since) for row in (await db.execute(stmt)).all()]
+    return build_query_distribution(rows)
+
+
+async def get_latency_percentiles(db: AsyncSession, days: int = 7) -> Dict:
+    """Per-stage latency percentiles for recent chat responses"""
+    since = datetime.utcnow() - timedelta(days=days)
+    rows = (await db.execute(latency_samples_statement(since))).all()
+    return build_latency_percentiles(rows, days)
@@ -2,46 +2,171 @@
 Database connection and session management
 """
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, inspect, text
 from sqlalchemy.orm import sessionmaker, Session
-from sqlalchemy.pool import StaticPool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.pool import StaticPool, QueuePool
 from contextlib import contextmanager
-from typing import Generator
+from typing import Generator, AsyncGenerator
 import os
+import time
 from models import Base
+import metrics
 
 # Database configuration
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./arth_mitra.db")
+if DATABASE_URL in ("sqlite://", "sqlite:///:memory:"):
+    # A plain in-memory database is private to one connection; a named shared-cache
+    # one lets the sync and async engines see the same tables
+    DATABASE_URL = "sqlite:///file:arth_mitra?mode=memory&cache=shared&uri=true"
+
+
+def _to_async_url(url: str) -> str:
+    """Map a sync database URL onto its async driver"""
+    if url.startswith("sqlite:"):
+        return url.replace("sqlite:", "sqlite+aiosqlite:", 1)
+    if url.startswith("postgresql:") or url.startswith("postgres:"):
+        return "postgresql+asyncpg:" + url.split(":", 1)[1]
+    return url
+
+
+# Async endpoints use their own engine on the same database
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", _to_async_url(DATABASE_URL))
+
+# Connection pool settings (per worker thread checkout)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+
+# SQLite tuning - WAL lets analytics reads run alongside chat writes
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")  # Safe with WAL, far fewer fsyncs than FULL
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))  # Retry window when the write lock is held
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "20000"))  # Page cache per connection
+SQLITE_MMAP_SIZE_MB = int(os.getenv("SQLITE_MMAP_SIZE_MB", "128"))  # Memory-mapped reads
+
+
+def _is_memory_sqlite(url: str) -> bool:
+    """In-memory SQLite databases only exist on a single connection"""
+    return url in ("sqlite://", "sqlite:///:memory:") or "mode=memory" in url
+
+
+def _sqlite_pragmas(url: str):
+    """Connect listener that tunes every new SQLite connection of the engine for url"""
+    memory = _is_memory_sqlite(url)
+
+    def apply(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+            if not memory:
+                cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+                cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE_MB * 1024 * 1024}")
+            cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+            cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")  # Negative value = size in KiB
+            cursor.execute("PRAGMA temp_store=MEMORY")
+        finally:
+            cursor.close()
+    return apply
+
 
 # Create engine
-# For SQLite, use StaticPool to avoid threading issues
 if DATABASE_URL.startswith("sqlite"):
-    engine = create_engine(
-        DATABASE_URL,
-        connect_args={"check_same_thread": False},
-        poolclass=StaticPool,
-        echo=False  # Set to True for SQL query debugging
-    )
+    if _is_memory_sqlite(DATABASE_URL):
+        # In-memory database lives as long as this connection; keep exactly one
+        engine = create_engine(
+            DATABASE_URL,
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool,
+            echo=False
+        )
+    else:
+        # File database: each worker thread checks out its own connection
+        engine = create_engine(
+            DATABASE_URL,
+            connect_args={
+                "check_same_thread": False,
+                "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000
+            },
+            poolclass=QueuePool,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            echo=False  # Set to True for SQL query debugging
+        )
+    event.listen(engine, "connect", _sqlite_pragmas(DATABASE_URL))
 else:
     # For PostgreSQL/MySQL
     engine = create_engine(
         DATABASE_URL,
         pool_pre_ping=True,
-        pool_size=10,
-        max_overflow=20
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW
     )
 
-# Create session factory
+# Create async engine - shares pool sizing and SQLite pragmas with the sync engine
+if ASYNC_DATABASE_URL.startswith("sqlite"):
+    if _is_memory_sqlite(ASYNC_DATABASE_URL):
+        async_engine = create_async_engine(ASYNC_DATABASE_URL, poolclass=StaticPool, echo=False)
+    else:
+        async_engine = create_async_engine(
+            ASYNC_DATABASE_URL,
+            connect_args={"timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            echo=False
+        )
+    event.listen(async_engine.sync_engine, "connect", _sqlite_pragmas(ASYNC_DATABASE_URL))
+else:
+    async_engine = create_async_engine(
+        ASYNC_DATABASE_URL,
+        pool_pre_ping=True,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW
+    )
+
+# Create session factories
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# expire_on_commit=False: async sessions cannot lazy-reload attributes after commit
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+
+# Commit latency (flush + COMMIT) for every session; AsyncSession commits run through the same sync Session
+@event.listens_for(Session, "before_commit")
+def _start_commit_timer(session):
+    session.info["commit_started"] = time.perf_counter()
+
+
+@event.listens_for(Session, "after_commit")
+def _record_commit_latency(session):
+    started = session.info.pop("commit_started", None)
+    if started is not None:
+        metrics.DB_COMMIT_DURATION.observe(time.perf_counter() - started)
 
 
 def init_db():
     """Initialize database - create all tables"""
     print("🔧 Initializing database...")
     Base.metadata.create_all(bind=engine)
+    _add_missing_columns()
+    # create_all skips existing tables, so add any indexes introduced since they were created
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
     print("✅ Database tables created successfully")
 
 
+def _add_missing_columns():
+    """Add nullable columns introduced after a table was first created"""
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing and column.nullable and not column.primary_key:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+                    print(f"  + Added column {table.name}.{column.name}")
+
+
 def get_db() -> Generator[Session, None, None]:
     """
     Dependency to get database session
@@ -54,6 +179,15 @@ def get_db() -> Generator[Session, None, None]:
         db.close()
 
 
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Dependency to get an async database session
+    Use in async FastAPI endpoints with Depends(get_async_db)
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
 @contextmanager
 def get_db_context():
     """
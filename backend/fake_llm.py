@@ -0,0 +1,64 @@
+"""
+Deterministic offline stand-in for the chat model
+Enabled with ARTH_FAKE_LLM=1 so load tests and benchmarks run without an API
+key or network, with the same output and simulated latency on every run.
+"""
+
+import os
+import time
+import zlib
+from typing import Iterator
+
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+FAKE_LLM_TOKENS = int(os.getenv("FAKE_LLM_TOKENS", "80"))  # Output tokens per response
+FAKE_LLM_TTFT_MS = float(os.getenv("FAKE_LLM_TTFT_MS", "200"))  # Simulated time to first token
+FAKE_LLM_TOKEN_DELAY_MS = float(os.getenv("FAKE_LLM_TOKEN_DELAY_MS", "10"))  # Simulated inter-token gap
+
+_VOCABULARY = (
+    "Under", "Section", "80C", "you", "can", "claim", "up", "to", "₹1.5", "lakh",
+    "for", "PPF,", "ELSS", "and", "NPS", "contributions;", "the", "new", "regime",
+    "offers", "lower", "slabs", "but", "fewer", "deductions.",
+)
+
+
+def fake_llm_enabled() -> bool:
+    return os.getenv("ARTH_FAKE_LLM", "").lower() in ("1", "true", "yes")
+
+
+class FakeLLM:
+    """Chat-model lookalike exposing invoke() and stream() with usage metadata"""
+
+    def __init__(self, tokens: int = FAKE_LLM_TOKENS, ttft_ms: float = FAKE_LLM_TTFT_MS, token_delay_ms: float = FAKE_LLM_TOKEN_DELAY_MS):
+        self.tokens = tokens
+        self.ttft = ttft_ms / 1000
+        self.token_delay = token_delay_ms / 1000
+
+    def _words(self, prompt: str):
+        # Same prompt -> same answer; different prompts start at different words
+        offset = zlib.crc32(prompt.encode("utf-8"))
+        return [_VOCABULARY[(offset + i) % len(_VOCABULARY)] for i in range(self.tokens)]
+
+    def _usage(self, prompt: str):
+        input_tokens = max(1, len(prompt) // 4)
+        return {"input_tokens": input_tokens, "output_tokens": self.tokens, "total_tokens": input_tokens + self.tokens}
+
+    def invoke(self, prompt: str) -> AIMessage:
+        time.sleep(self.ttft + self.token_delay * max(0, self.tokens - 1))
+        return AIMessage(content=" ".join(self._words(prompt)), usage_metadata=self._usage(prompt))
+
+    def __call__(self, prompt) -> AIMessage:
+        """Lets the model sit in an LCEL chain (coerced to a RunnableLambda); accepts prompt values"""
+        return self.invoke(prompt.to_string() if hasattr(prompt, "to_string") else prompt)
+
+    def stream(self, prompt: str) -> Iterator[AIMessageChunk]:
+        words = self._words(prompt)
+        time.sleep(self.ttft)
+        for index, word in enumerate(words):
+            if index:
+                time.sleep(self.token_delay)
+            last = index == len(words) - 1
+            yield AIMessageChunk(
+                content=word if index == 0 else " " + word,
+                usage_metadata=self._usage(prompt) if last else None,
+            )
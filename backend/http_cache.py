@@ -0,0 +1,90 @@
+"""
+Short-TTL result cache with HTTP validators (ETag / Last-Modified)
+Used by polled read-only endpoints such as the analytics dashboard
+"""
+
+import asyncio
+import hashlib
+import json
+import time
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+from fastapi import Request, Response
+
+
+class TTLResultCache:
+    """Caches serialized JSON results per key; one recompute per key per TTL window"""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._entries: Dict[Hashable, Dict] = {}
+        self._locks: Dict[Hashable, asyncio.Lock] = {}
+
+    def _fresh(self, entry) -> bool:
+        return entry is not None and entry["expires_at"] > time.monotonic()
+
+    async def get_or_compute(self, key: Hashable, compute: Callable[[], Awaitable[Any]]) -> Dict:
+        """Return the cached entry for key, computing it at most once per TTL window"""
+        entry = self._entries.get(key)
+        if self._fresh(entry):
+            return entry
+
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            # Another request may have refreshed the entry while we waited
+            entry = self._entries.get(key)
+            if self._fresh(entry):
+                return entry
+
+            payload = await compute()
+            body = json.dumps(payload, separators=(",", ":"), sort_keys=True).encode("utf-8")
+            etag = f'"{hashlib.md5(body).hexdigest()}"'
+
+            # Keep the previous Last-Modified when the content did not change
+            if entry is not None and entry["etag"] == etag:
+                last_modified = entry["last_modified"]
+            else:
+                last_modified = datetime.now(timezone.utc).replace(microsecond=0)
+
+            entry = {
+                "body": body,
+                "etag": etag,
+                "last_modified": last_modified,
+                "expires_at": time.monotonic() + self.ttl,
+            }
+            self._entries[key] = entry
+            return entry
+
+    def clear(self):
+        """Drop all cached results"""
+        self._entries.clear()
+
+
+def _not_modified(request: Request, entry: Dict) -> bool:
+    """Evaluate conditional request headers against a cache entry"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or entry["etag"] in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return entry["last_modified"] <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def cached_json_response(request: Request, entry: Dict, ttl: float) -> Response:
+    """Build a 200 or 304 response carrying ETag, Last-Modified and Cache-Control"""
+    headers = {
+        "ETag": entry["etag"],
+        "Last-Modified": format_datetime(entry["last_modified"], usegmt=True),
+        "Cache-Control": f"public, max-age={int(ttl)}",
+    }
+    if _not_modified(request, entry):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry["body"], media_type="application/json", headers=headers)
@@ -0,0 +1,215 @@
+"""
+Background document ingestion
+Uploads are streamed to content-addressed storage (SHA-256 computed while
+writing, identical files stored once) and indexed here on a small worker pool,
+so parsing and embedding a large PDF never holds an HTTP request open.
+Jobs live in memory (per process) and report stage and progress for polling.
+"""
+
+import hashlib
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+from logging_config import get_logger
+
+# Parsing runs in parallel; vector store writes are serialized inside the bot
+INGESTION_WORKERS = int(os.getenv("INGESTION_WORKERS", "2"))
+# Finished jobs are kept this long for status polling
+INGESTION_JOB_TTL = float(os.getenv("INGESTION_JOB_TTL", "3600"))
+UPLOAD_DIR = "./uploads"  # Content-addressed: <sha[:2]>/<sha>/<filename>
+UPLOAD_READ_CHUNK = 1024 * 1024  # Uploads are hashed and copied to disk 1 MB at a time
+
+logger = get_logger("ingestion")
+
+_executor = ThreadPoolExecutor(max_workers=INGESTION_WORKERS, thread_name_prefix="ingest")
+_jobs: Dict[str, "IngestionJob"] = {}
+_content_locks: Dict[str, list] = {}  # content hash -> [lock, holders]; dropped when the last holder leaves
+_lock = threading.Lock()
+
+
+def save_upload(upload, upload_dir: str) -> Tuple[str, str, int]:
+    """
+    Stream an UploadFile to UPLOAD_DIR/<sha[:2]>/<sha>/<filename>, hashing as it is written.
+    Blocking file I/O: call from a sync endpoint (FastAPI runs those in its threadpool).
+    Content that is already stored keeps its first path (and filename), so identical
+    uploads share one file and one set of chunks. Returns (path, sha256, size).
+    """
+    digest = hashlib.sha256()
+    size = 0
+    # Each upload is written into its own staging folder, which is then renamed into place
+    staging_dir = os.path.join(upload_dir, f".incoming-{uuid.uuid4().hex}")
+    os.makedirs(staging_dir)
+    staged_path = os.path.join(staging_dir, os.path.basename(upload.filename))
+    try:
+        with open(staged_path, "wb") as buffer:
+            while chunk := upload.file.read(UPLOAD_READ_CHUNK):
+                digest.update(chunk)
+                buffer.write(chunk)
+                size += len(chunk)
+
+        content_hash = digest.hexdigest()
+        blob_dir = os.path.join(upload_dir, content_hash[:2], content_hash)
+        os.makedirs(os.path.dirname(blob_dir), exist_ok=True)
+        try:
+            # Atomic: of concurrent uploads of the same content exactly one folder lands
+            os.rename(staging_dir, blob_dir)
+        except OSError:
+            if not os.listdir(blob_dir):  # Empty folder left behind (rename can't replace it on Windows)
+                os.replace(staged_path, os.path.join(blob_dir, os.path.basename(staged_path)))
+        stored = sorted(os.listdir(blob_dir))
+        return os.path.join(blob_dir, stored[0]), content_hash, size
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+
+
+@contextmanager
+def content_lock(content_hash: Optional[str]):
+    """Serialize jobs for the same content so a duplicate waits and then finds it indexed"""
+    if content_hash is None:  # Rows from before content hashing have nothing to share
+        yield
+        return
+    with _lock:
+        entry = _content_locks.setdefault(content_hash, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _lock:
+            entry[1] -= 1
+            if not entry[1]:
+                del _content_locks[content_hash]
+
+
+class IngestionJob:
+    """State of one upload being indexed"""
+
+    def __init__(
+        self,
+        filename: str,
+        file_path: str,
+        user_id: Optional[str] = None,
+        document_id: Optional[str] = None,
+        content_hash: Optional[str] = None,
+        kind: str = "upload"
+    ):
+        self.id = str(uuid.uuid4())
+        self.kind = kind  # upload | reindex
+        self.filename = filename
+        self.file_path = file_path
+        self.content_hash = content_hash
+        self.user_id = user_id
+        self.document_id = document_id
+        self.status = "queued"  # queued -> running -> done | skipped | failed
+        self.outcome: Optional[str] = None  # Final status, published once on_finished has run
+        self.stage = "queued"  # loading, chunking, embedding while running
+        self.progress = 0.0
+        self.chunks_indexed = 0
+        self.chunk_ids: List[str] = []
+        self.chunks_removed = 0
+        self.deduplicated = False  # Content was already indexed; no embedding work done
+        self.message = "Queued for indexing"
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "skipped", "failed")
+
+    def report(self, stage: str, progress: float) -> None:
+        """Progress callback passed to ArthMitraBot.add_documents"""
+        self.stage = stage
+        self.progress = round(min(max(progress, 0.0), 1.0), 3)
+
+    def to_dict(self) -> Dict:
+        def iso(timestamp):
+            return time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(timestamp)) if timestamp else None
+
+        return {
+            "jobId": self.id,
+            "kind": self.kind,
+            "filename": self.filename,
+            "documentId": self.document_id,
+            "status": self.status,
+            "stage": self.stage,
+            "progress": self.progress,
+            "chunksIndexed": self.chunks_indexed,
+            "chunksRemoved": self.chunks_removed,
+            "deduplicated": self.deduplicated,
+            "message": self.message,
+            "error": self.error,
+            "createdAt": iso(self.created_at),
+            "startedAt": iso(self.started_at),
+            "finishedAt": iso(self.finished_at),
+        }
+
+
+def _prune_jobs(now: float) -> None:
+    expired = [job_id for job_id, job in _jobs.items() if job.finished and now - job.finished_at > INGESTION_JOB_TTL]
+    for job_id in expired:
+        del _jobs[job_id]
+
+
+def get_job(job_id: str) -> Optional[IngestionJob]:
+    with _lock:
+        return _jobs.get(job_id)
+
+
+def _run_job(job: IngestionJob, index: Callable[[IngestionJob], Dict], on_finished: Optional[Callable[[IngestionJob], None]]) -> None:
+    job.status = "running"
+    job.started_at = time.time()
+    job.message = "Indexing"
+    try:
+        result = index(job)
+        job.chunks_indexed = result.get("chunks_indexed", 0)
+        job.chunk_ids = result.get("chunk_ids", [])
+        job.chunks_removed = result.get("chunks_removed", 0)
+        job.deduplicated = result.get("deduplicated", False)
+        job.outcome = "skipped" if result["status"] == "skipped" else ("done" if result["status"] == "success" else "failed")
+        message = result["message"]
+        job.report("finished", 1.0)
+    except Exception as e:
+        logger.exception("Ingestion job failed", extra={"job_id": job.id, "document": job.filename})
+        job.outcome = "failed"
+        job.error = str(e)
+        message = f"Indexing failed: {e}"
+
+    # Pollers must not see a final status before the Document row is updated
+    if on_finished is not None:
+        try:
+            on_finished(job)
+        except Exception as e:
+            logger.warning("Ingestion job callback failed", extra={"job_id": job.id, "error": str(e)})
+
+    job.message = message
+    job.finished_at = time.time()
+    job.status = job.outcome
+    logger.info("Ingestion job finished", extra={
+        "job_id": job.id, "kind": job.kind, "document": job.filename, "status": job.status,
+        "chunks": job.chunks_indexed, "ms": round((job.finished_at - job.started_at) * 1000, 1)
+    })
+
+
+def submit_job(
+    job: IngestionJob,
+    index: Callable[[IngestionJob], Dict],
+    on_finished: Optional[Callable[[IngestionJob], None]] = None
+) -> IngestionJob:
+    """
+    Queue index(job) on the worker pool. index returns the add_documents result;
+    on_finished runs on the worker afterwards (e.g. to update the Document row) and
+    sees the result in job.outcome; job.status turns final only once it returns.
+    """
+    with _lock:
+        _prune_jobs(time.time())
+        _jobs[job.id] = job
+    _executor.submit(_run_job, job, index, on_finished)
+    return job
@@ -0,0 +1,99 @@
+"""
+Structured, level-gated logging for the API and bot
+Records go through a QueueHandler so request threads never block on stdout;
+a single QueueListener thread formats and writes them. High-frequency events
+(per streamed token) are sampled and cost one integer check when disabled.
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import time
+from typing import Optional
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")  # "text" or "json"
+LOG_TOKEN_SAMPLE_EVERY = int(os.getenv("LOG_TOKEN_SAMPLE_EVERY", "100"))  # Log every Nth streamed chunk at DEBUG
+
+ROOT_LOGGER = "arthmitra"
+
+# Attributes every LogRecord has; anything else came from extra={...}
+_RESERVED_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def _extra_fields(record: logging.LogRecord) -> dict:
+    return {key: value for key, value in vars(record).items() if key not in _RESERVED_ATTRS}
+
+
+class KeyValueFormatter(logging.Formatter):
+    """Human-readable line followed by the structured fields as key=value"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)-7s %(name)s: %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = _extra_fields(record)
+        if fields:
+            line += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, for log shippers"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            **_extra_fields(record),
+        }
+        if record.exc_info:
+            payload["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str, ensure_ascii=False)
+
+
+def setup_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT):
+    """Route the app's loggers through a queue to a background writer (idempotent)"""
+    global _listener
+    if _listener is not None:
+        return
+
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JsonFormatter() if fmt == "json" else KeyValueFormatter())
+
+    log_queue: queue.Queue = queue.Queue(-1)
+    _listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+    root = logging.getLogger(ROOT_LOGGER)
+    root.setLevel(level)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.propagate = False
+
+
+def shutdown_logging():
+    """Flush queued records and stop the writer thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Logger under the app namespace, e.g. get_logger("bot") -> arthmitra.bot"""
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+
+def sample_token(logger: logging.Logger, index: int) -> bool:
+    """True when the index-th streamed chunk should be logged (DEBUG enabled and sampled)"""
+    return LOG_TOKEN_SAMPLE_EVERY > 0 and index % LOG_TOKEN_SAMPLE_EVERY == 0 and logger.isEnabledFor(logging.DEBUG)
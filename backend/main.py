@@ -1,19 +1,30 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Depends
-from fastapi.responses import StreamingResponse
+from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, Query, Request, BackgroundTasks
+from fastapi.responses import StreamingResponse, Response
+from starlette.background import BackgroundTask
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import List, Optional, Tuple
 import os
 import sys
-import shutil
 from contextlib import asynccontextmanager
 import json
 import time
 
-from bot import initialize_bot, get_bot
-from database import get_db, init_db
+from bot import initialize_bot, get_bot, format_user_profile
+from database import get_db, get_async_db, get_db_context, init_db
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 import crud
+import crud_async
+from http_cache import TTLResultCache, cached_json_response
+from profile_cache import profile_cache
+from security import auth_slot, AuthOverloadedError
+from ingestion import IngestionJob, submit_job, get_job, save_upload, content_lock, UPLOAD_DIR
+import metrics
+from logging_config import setup_logging, get_logger
+
+setup_logging()
+logger = get_logger("api")
 
 # Pydantic models for request/response
 class UserProfile(BaseModel):
@@ -37,9 +48,9 @@ class ChatMessage(BaseModel):
 
 class ChatRequest(BaseModel):
     message: str
-    profile: Optional[UserProfile] = None
+    profile: Optional[UserProfile] = None  # Omit to use the stored profile of userId
     history: Optional[List[ChatMessage]] = None
-    userId: Optional[str] = None  # For database logging
+    userId: Optional[str] = None  # For database logging and stored profile lookup
     sessionId: Optional[str] = None  # For database logging
 
 class ChatResponse(BaseModel):
@@ -49,6 +60,8 @@ class ChatResponse(BaseModel):
 class UploadResponse(BaseModel):
     status: str
     message: str
+    jobId: Optional[str] = None  # Poll GET /api/upload/jobs/{jobId} for progress
+    documentId: Optional[str] = None
 
 class StatusResponse(BaseModel):
     initialized: bool
@@ -100,15 +113,14 @@ class SavedMessageCreate(BaseModel):
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup: Bot will initialize on first request (lazy loading)
-    print("⚡ Arth-Mitra API starting up...")
-    print("📝 Bot will initialize on first chat/upload request")
+    logger.info("Arth-Mitra API starting up; bot will initialize on first chat/upload request")
     
     # Initialize database
-    print("🔧 Initializing database...")
+    logger.info("Initializing database")
     init_db()
-    print("✅ Database ready")
-    
-    print(f"🔐 Checking API keys...")
+    with get_db_context() as db:
+        crud.ensure_analytics_rollups(db)
+    logger.info("Database ready")
     
     from dotenv import load_dotenv
     load_dotenv()
@@ -117,16 +129,15 @@ async def lifespan(app: FastAPI):
     openrouter_key = os.getenv("OPENROUTER_API_KEY")
     
     if gemini_key:
-        print("✅ Gemini API key found")
+        logger.info("API key found", extra={"provider": "gemini"})
     elif openrouter_key:
-        print("✅ OpenRouter API key found")
+        logger.info("API key found", extra={"provider": "openrouter"})
     else:
-        print("⚠️ WARNING: No API key configured in .env")
-        print("Set GEMINI_API_KEY or OPENROUTER_API_KEY to use the backend")
+        logger.warning("No API key configured in .env; set GEMINI_API_KEY or OPENROUTER_API_KEY to use the backend")
     
     yield
-    # Shutdown: cleanup if needed
-    print("Shutting down...")
+    # Shutdown: cleanup if needed (queued log records are flushed at exit)
+    logger.info("Shutting down")
 
 app = FastAPI(
     title="Arth-Mitra API",
@@ -142,11 +153,23 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(metrics.MetricsMiddleware)
 
 # Upload directory
-UPLOAD_DIR = "./uploads"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
+# Cursor pagination for list endpoints
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Dashboard polling is served from this cache; at most one DB recompute per key per TTL
+ANALYTICS_CACHE_TTL = float(os.getenv("ANALYTICS_CACHE_TTL", "15"))
+MAX_ANALYTICS_DAYS = 365  # Also bounds the analytics cache to one entry per day count
+analytics_cache = TTLResultCache(ttl=ANALYTICS_CACHE_TTL)
+
+# Accounts with more chat messages than this are deleted after the response is sent
+BACKGROUND_DELETE_THRESHOLD = int(os.getenv("BACKGROUND_DELETE_THRESHOLD", "5000"))
+
 
 @app.get("/ping")
 def health():
@@ -159,8 +182,19 @@ def hello():
     return {"message": "Backend connected successfully"}
 
 
+def resolve_chat_profile(request: ChatRequest, db: Session) -> Tuple[Optional[dict], Optional[str]]:
+    """Profile dict and formatted profile block for a chat request"""
+    if request.profile:
+        return request.profile.dict(), None
+    if request.userId:
+        entry = crud.get_cached_user_profile(db, request.userId)
+        if entry and entry["profile"]:
+            return entry["profile"], profile_cache.profile_text(entry, format_user_profile)
+    return None, None
+
+
 @app.post("/api/chat", response_model=ChatResponse)
-def chat(request: ChatRequest, db: Session = Depends(get_db)):
+def chat(request: ChatRequest, response: Response, db: Session = Depends(get_db)):
     """Chat with Arth-Mitra AI assistant"""
     start_time = time.time()
     
@@ -168,19 +202,20 @@ def chat(request: ChatRequest, db: Session = Depends(get_db)):
         bot = get_bot()
         if not bot._initialized:
             # Initialize bot on first request
-            print("🔄 Initializing bot for first time...")
-            bot.initialize(auto_index=True)
-            print("✅ Bot initialized successfully")
+            logger.info("Initializing bot for first time")
+            bot.ensure_initialized()
+            logger.info("Bot initialized")
         
-        # Convert profile to dict if provided
-        profile_dict = request.profile.dict() if request.profile else None
+        # Use the provided profile, or the cached stored profile for userId
+        profile_dict, profile_text = resolve_chat_profile(request, db)
         history = [msg.dict() for msg in request.history] if request.history else None
         
         # Get bot response
-        result = bot.get_response(request.message, profile=profile_dict, history=history)
+        result = bot.get_response(request.message, profile=profile_dict, history=history, profile_text=profile_text)
         
         # Calculate response time
         response_time = time.time() - start_time
+        response.headers["X-Cache"] = "hit" if result.get("cached") else "miss"
         
         # Log to database if user_id and session_id provided
         if request.userId and request.sessionId:
@@ -195,7 +230,9 @@ def chat(request: ChatRequest, db: Session = Depends(get_db)):
                     db, request.sessionId, "assistant", result["response"],
                     sources=result["sources"],
                     response_time=response_time,
-                    cached=result.get("cached", False)
+                    cached=result.get("cached", False),
+                    tokens_used=result.get("tokens_used"),
+                    timings=result.get("timings")
                 )
                 
                 # Log analytics event
@@ -204,70 +241,120 @@ def chat(request: ChatRequest, db: Session = Depends(get_db)):
                     "response_time": response_time
                 })
             except Exception as e:
-                print(f"⚠️ Failed to log to database: {e}")
+                logger.warning("Failed to log chat to database", extra={"error": str(e)})
         
         return ChatResponse(
             response=result["response"],
             sources=result["sources"]
         )
     except RuntimeError as e:
-        print(f"❌ Runtime Error: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Chat runtime error")
         raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
-        print(f"❌ Error: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Chat error")
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
 
 @app.post("/api/chat/stream")
 def chat_stream(request: ChatRequest):
     """Stream chat response tokens via SSE"""
+    start_time = time.time()
+
     try:
         bot = get_bot()
         if not bot._initialized:
-            print("🔄 Initializing bot for first time...")
-            bot.initialize(auto_index=True)
-            print("✅ Bot initialized successfully")
+            logger.info("Initializing bot for first time")
+            bot.ensure_initialized()
+            logger.info("Bot initialized")
 
-        profile_dict = request.profile.dict() if request.profile else None
+        with get_db_context() as db:
+            profile_dict, profile_text = resolve_chat_profile(request, db)
         history = [msg.dict() for msg in request.history] if request.history else None
 
-        token_iter, sources = bot.stream_response(request.message, profile=profile_dict, history=history)
+        # Filled in by the bot and the generator, read by the post-stream persistence task
+        stream_state = {"tokens": [], "ttft": None, "response_time": None, "completed": False, "stats": {}}
+
+        token_iter, sources = bot.stream_response(
+            request.message, profile=profile_dict, history=history, profile_text=profile_text,
+            stats=stream_state["stats"]
+        )
 
         def event_stream():
             token_count = 0
             try:
                 for token in token_iter:
                     if token:
+                        if stream_state["ttft"] is None:
+                            stream_state["ttft"] = time.time() - start_time
+                            metrics.CHAT_TTFT.observe(stream_state["ttft"])
                         token_count += 1
+                        stream_state["tokens"].append(token)
                         yield f"event: token\ndata: {json.dumps(token)}\n\n"
-                print(f"📤 Streamed {token_count} tokens")
+                logger.info("Stream completed", extra={"tokens": token_count, "duration_ms": round((time.time() - start_time) * 1000, 1)})
+                stream_state["response_time"] = time.time() - start_time
+                stream_state["completed"] = True
                 yield f"event: sources\ndata: {json.dumps(sources)}\n\n"
                 yield "event: done\ndata: [DONE]\n\n"
             except Exception as e:
-                print(f"❌ Stream error: {e}")
+                logger.exception("Stream error")
                 yield f"event: error\ndata: {json.dumps(str(e))}\n\n"
                 yield "event: done\ndata: [DONE]\n\n"
 
-        return StreamingResponse(event_stream(), media_type="text/event-stream")
+        # Persistence runs after the last SSE frame is flushed, so it never delays the stream
+        background = None
+        if request.userId and request.sessionId:
+            background = BackgroundTask(
+                persist_stream_result, request.userId, request.sessionId,
+                request.message, sources, stream_state
+            )
+
+        return StreamingResponse(
+            event_stream(), media_type="text/event-stream", background=background,
+            headers={"X-Cache": "hit" if stream_state["stats"].get("cached") else "miss"}
+        )
     except RuntimeError as e:
         raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
 
-@app.post("/api/upload", response_model=UploadResponse)
-async def upload_document(file: UploadFile = File(...), user_id: Optional[str] = None, db: Session = Depends(get_db)):
-    """Upload and index a document (PDF, CSV, TXT)"""
+def persist_stream_result(user_id: str, session_id: str, message: str, sources: List[str], stream_state: dict):
+    """Save a completed streamed exchange and its analytics event"""
+    if not stream_state["completed"]:
+        return
+
+    stats = stream_state["stats"]
+    timings = dict(stats.get("timings") or {})
+    if stream_state["ttft"] is not None:
+        timings["ttft"] = round(stream_state["ttft"] * 1000, 2)
+
+    try:
+        with get_db_context() as db:
+            crud.create_chat_message(db, session_id, "user", message)
+            crud.create_chat_message(
+                db, session_id, "assistant", "".join(stream_state["tokens"]),
+                sources=sources,
+                response_time=stream_state["response_time"],
+                cached=stats.get("cached", False),
+                tokens_used=stats.get("tokens_used"),
+                timings=timings
+            )
+            crud.log_event(db, user_id, "query", {
+                "message": message[:100],
+                "response_time": stream_state["response_time"],
+                "ttft": stream_state["ttft"],
+                "tokens": len(stream_state["tokens"]),
+                "streamed": True,
+                "cached": stats.get("cached", False)
+            })
+    except Exception as e:
+        logger.warning("Failed to log stream to database", extra={"error": str(e)})
+
+
+@app.post("/api/upload", response_model=UploadResponse, status_code=202)
+def upload_document(response: Response, file: UploadFile = File(...), user_id: Optional[str] = None, db: Session = Depends(get_db)):
+    """Save a document (PDF, CSV, TXT) and queue it for background indexing (sync: runs in the threadpool)"""
     try:
-        bot = get_bot()
-        if not bot._initialized:
-            # Initialize bot on first request
-            bot.initialize(auto_index=True)
-        
         # Validate file type
         allowed_extensions = [".pdf", ".csv", ".txt", ".md"]
         file_ext = os.path.splitext(file.filename)[1].lower()
@@ -278,43 +365,56 @@ async def upload_document(file: UploadFile = File(...), user_id: Optional[str] =
                 detail=f"Unsupported file type. Allowed: {allowed_extensions}"
             )
         
-        # Save file
-        file_path = os.path.join(UPLOAD_DIR, file.filename)
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        # Get file size
-        file_size = os.path.getsize(file_path)
+        # Stream to content-addressed storage; identical content is stored once
+        file_path, content_hash, file_size = save_upload(file, UPLOAD_DIR)
         
-        # Index document
-        result = bot.add_documents(file_path)
-        
-        # Extract chunks indexed from message
-        chunks_indexed = 0
-        if "Indexed" in result["message"]:
-            import re
-            match = re.search(r'Indexed (\d+) chunks', result["message"])
-            if match:
-                chunks_indexed = int(match.group(1))
-        
-        # Log to database if user_id provided
+        # Document row starts unindexed; the job fills in chunks_indexed.
+        # Content already indexed for anyone just gets a per-user reference, with no job.
+        document_id = None
         if user_id:
             try:
-                crud.create_document(
-                    db, user_id, file.filename, file_path, 
-                    file_ext, file_size, chunks_indexed
-                )
-                crud.log_event(db, user_id, "upload", {
-                    "filename": file.filename,
-                    "file_type": file_ext,
-                    "chunks": chunks_indexed
-                })
+                document = crud.get_user_document_by_hash(db, user_id, content_hash)
+                indexed = document if document and document.is_indexed else crud.get_indexed_document_by_hash(db, content_hash)
+                if document is None:
+                    document = crud.create_document(
+                        db, user_id, file.filename, file_path, file_ext, file_size,
+                        chunks_indexed=indexed.chunks_indexed if indexed else 0,
+                        content_hash=content_hash,
+                        chunk_ids=indexed.chunk_ids if indexed else None
+                    )
+                elif indexed and not document.is_indexed:
+                    crud.mark_document_indexed(db, document.id, indexed.chunks_indexed, indexed.chunk_ids)
+                document_id = document.id
+                
+                if indexed:
+                    crud.log_event(db, user_id, "upload", {
+                        "filename": file.filename,
+                        "file_type": file_ext,
+                        "chunks": indexed.chunks_indexed,
+                        "status": "done",
+                        "deduplicated": True
+                    })
+                    response.status_code = 200
+                    return UploadResponse(
+                        status="done",
+                        message=f"{file.filename} is already indexed ({indexed.chunks_indexed} chunks)",
+                        documentId=document_id
+                    )
             except Exception as e:
-                print(f"⚠️ Failed to log document to database: {e}")
+                logger.warning("Failed to log document to database", extra={"document": file.filename, "error": str(e)})
+        
+        job = submit_job(
+            IngestionJob(file.filename, file_path, user_id=user_id, document_id=document_id, content_hash=content_hash),
+            index_upload,
+            on_finished=record_upload_result
+        )
+        logger.info("Upload queued for indexing", extra={"job_id": job.id, "document": file.filename, "bytes": file_size})
         
         return UploadResponse(
-            status=result["status"],
-            message=result["message"]
+            status=job.status,
+            message=f"{file.filename} uploaded; indexing in background",
+            jobId=job.id,
+            documentId=document_id
         )
     except HTTPException:
         raise
@@ -322,6 +422,150 @@ async def upload_document(file: UploadFile = File(...), user_id: Optional[str] =
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
 
 
+def index_upload(job: IngestionJob) -> dict:
+    """Worker-side indexing for an upload job (initializes the bot on first use)"""
+    bot = get_bot()
+    if not bot._initialized:
+        job.report("initializing", 0.0)
+        bot.ensure_initialized()
+    with content_lock(job.content_hash):
+        # Stored content that is already in the index costs no embedding work
+        existing = bot.indexed_chunk_ids(job.file_path)
+        if existing:
+            return {
+                "status": "success",
+                "message": f"{job.filename} is already indexed ({len(existing)} chunks)",
+                "chunks_indexed": len(existing),
+                "chunk_ids": existing,
+                "deduplicated": True
+            }
+        return bot.add_documents(job.file_path, progress=job.report)
+
+
+def reindex_upload(job: IngestionJob) -> dict:
+    """Worker-side re-chunking of a stored document; replaces exactly its old vectors"""
+    bot = get_bot()
+    if not bot._initialized:
+        job.report("initializing", 0.0)
+        bot.ensure_initialized()
+    with content_lock(job.content_hash):
+        return bot.reindex_document(job.file_path, progress=job.report)
+
+
+def record_upload_result(job: IngestionJob):
+    """Store the job outcome on the Document rows for its content and log the event"""
+    if not job.user_id:
+        return
+    with get_db_context() as db:
+        if job.document_id and job.outcome != "failed":
+            crud.mark_document_indexed(db, job.document_id, job.chunks_indexed, job.chunk_ids)
+        crud.log_event(db, job.user_id, job.kind, {
+            "filename": job.filename,
+            "file_type": os.path.splitext(job.filename)[1].lower(),
+            "chunks": job.chunks_indexed,
+            "status": job.outcome,
+            "deduplicated": job.deduplicated
+        })
+
+
+@app.get("/api/upload/jobs/{job_id}")
+def get_upload_job(job_id: str):
+    """Status and progress of a background indexing job"""
+    job = get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+
+@app.delete("/api/documents/{document_id}")
+def delete_document(document_id: str, db: Session = Depends(get_db)):
+    """Delete a document; its vectors and stored file go once no other user references the content"""
+    try:
+        document = crud.get_document(db, document_id)
+        if not document:
+            raise HTTPException(status_code=404, detail="Document not found")
+        
+        chunks_removed = 0
+        shared = document.content_hash and crud.count_content_references(db, document.content_hash) > 1
+        if not shared:
+            bot = get_bot().ensure_initialized()
+            with content_lock(document.content_hash):
+                if document.chunk_ids:
+                    chunks_removed = bot.delete_chunks(document.chunk_ids)
+                else:
+                    chunks_removed = bot.delete_chunks(source=document.file_path)
+            remove_stored_upload(document.file_path)
+        
+        crud.delete_document(db, document_id)
+        crud.log_event(db, document.user_id, "document_delete", {
+            "filename": document.filename,
+            "chunks_removed": chunks_removed,
+            "shared": bool(shared)
+        })
+        return {
+            "status": "success",
+            "message": f"Deleted {document.filename}",
+            "chunksRemoved": chunks_removed
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to delete document: {str(e)}")
+
+
+def remove_stored_upload(file_path: str):
+    """Remove an uploaded file (and its content-addressed folder); never touches files outside UPLOAD_DIR"""
+    upload_root = os.path.abspath(UPLOAD_DIR)
+    path = os.path.abspath(file_path)
+    if os.path.commonpath([upload_root, path]) != upload_root or not os.path.exists(path):
+        return
+    os.remove(path)
+    folder = os.path.dirname(path)
+    while folder != upload_root and not os.listdir(folder):
+        os.rmdir(folder)
+        folder = os.path.dirname(folder)
+
+
+@app.post("/api/documents/{document_id}/reindex", response_model=UploadResponse, status_code=202)
+def reindex_document(document_id: str, db: Session = Depends(get_db)):
+    """Re-chunk and re-embed a document with the current settings on the ingestion pool"""
+    document = crud.get_document(db, document_id)
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+    if not os.path.exists(document.file_path):
+        raise HTTPException(status_code=409, detail="Stored file is missing; upload the document again")
+    
+    job = submit_job(
+        IngestionJob(
+            document.filename, document.file_path, user_id=document.user_id,
+            document_id=document.id, content_hash=document.content_hash, kind="reindex"
+        ),
+        reindex_upload,
+        on_finished=record_upload_result
+    )
+    return UploadResponse(
+        status=job.status,
+        message=f"{document.filename} queued for re-indexing",
+        jobId=job.id,
+        documentId=document.id
+    )
+
+
+def _vector_index_size() -> int:
+    """Chunks in the vector index, or 0 before the bot is initialized"""
+    bot = get_bot()
+    return bot.vectorstore._collection.count() if bot.vectorstore is not None else 0
+
+
+metrics.VECTOR_INDEX_SIZE.set_function(_vector_index_size)
+
+
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    """Prometheus text exposition of request, RAG pipeline, cache and DB metrics"""
+    return Response(content=metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+
 @app.get("/api/status", response_model=StatusResponse)
 def get_status():
     """Get bot status and statistics"""
@@ -353,23 +597,24 @@ def clear_cache():
 # ==================== NEW DATABASE ENDPOINTS ====================
 
 @app.post("/api/users/register")
-def register_user(user: UserRegister, db: Session = Depends(get_db)):
+async def register_user(user: UserRegister, db: AsyncSession = Depends(get_async_db)):
     """Register a new user"""
     try:
-        # Check if user already exists
-        existing_user = crud.get_user_by_email(db, user.email)
-        if existing_user:
-            raise HTTPException(status_code=400, detail="Email already registered")
-        
-        existing_username = crud.get_user_by_username(db, user.username)
-        if existing_username:
-            raise HTTPException(status_code=400, detail="Username already taken")
-        
-        # Create user
-        new_user = crud.create_user(db, user.email, user.username, user.password)
+        async with auth_slot("register"):
+            # Check if user already exists
+            existing_user = await crud_async.get_user_by_email(db, user.email)
+            if existing_user:
+                raise HTTPException(status_code=400, detail="Email already registered")
+            
+            existing_username = await crud_async.get_user_by_username(db, user.username)
+            if existing_username:
+                raise HTTPException(status_code=400, detail="Username already taken")
+            
+            # Create user (password hashed on the bounded worker pool)
+            new_user = await crud_async.create_user(db, user.email, user.username, user.password)
         
         # Log event
-        crud.log_event(db, new_user.id, "register", {"email": user.email})
+        await crud_async.log_event(db, new_user.id, "register", {"email": user.email})
         
         return {
             "status": "success",
@@ -378,26 +623,32 @@ def register_user(user: UserRegister, db: Session = Depends(get_db)):
         }
     except HTTPException:
         raise
+    except AuthOverloadedError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Registration failed: {str(e)}")
 
 
 @app.post("/api/users/login")
-def login_user(credentials: UserLogin, db: Session = Depends(get_db)):
+async def login_user(credentials: UserLogin, db: AsyncSession = Depends(get_async_db)):
     """Login user"""
     try:
-        user = crud.get_user_by_email(db, credentials.email)
-        if not user:
-            raise HTTPException(status_code=401, detail="Invalid email or password")
-        
-        if not crud.verify_password(user, credentials.password):
-            raise HTTPException(status_code=401, detail="Invalid email or password")
+        async with auth_slot("login"):
+            user = await crud_async.get_user_by_email(db, credentials.email)
+            if not user:
+                raise HTTPException(status_code=401, detail="Invalid email or password")
+            
+            if not await crud_async.verify_password(user, credentials.password):
+                raise HTTPException(status_code=401, detail="Invalid email or password")
+            
+            # Upgrade hashes made with an older cost factor
+            await crud_async.rehash_password_if_needed(db, user, credentials.password)
         
         # Update last login
-        crud.update_last_login(db, user.id)
+        await crud_async.update_last_login(db, user.id)
         
         # Log event
-        crud.log_event(db, user.id, "login", {"email": credentials.email})
+        await crud_async.log_event(db, user.id, "login", {"email": credentials.email})
         
         return {
             "status": "success",
@@ -406,17 +657,19 @@ def login_user(credentials: UserLogin, db: Session = Depends(get_db)):
         }
     except HTTPException:
         raise
+    except AuthOverloadedError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Login failed: {str(e)}")
 
 
 @app.get("/api/users/{user_id}/profile")
 def get_user_profile(user_id: str, db: Session = Depends(get_db)):
-    """Get user profile"""
-    user = crud.get_user_by_id(db, user_id)
-    if not user:
+    """Get user profile (served from the profile cache)"""
+    entry = crud.get_cached_user_profile(db, user_id)
+    if not entry:
         raise HTTPException(status_code=404, detail="User not found")
-    return user.to_dict()
+    return entry["user"]
 
 
 @app.put("/api/users/{user_id}/profile")
@@ -442,22 +695,23 @@ def update_profile(user_id: str, profile: UserProfile, db: Session = Depends(get
 
 
 @app.post("/api/users/{user_id}/change-password")
-def change_password(user_id: str, pwd_change: ChangePassword, db: Session = Depends(get_db)):
+async def change_password(user_id: str, pwd_change: ChangePassword, db: AsyncSession = Depends(get_async_db)):
     """Change user password"""
     try:
-        user = crud.get_user_by_id(db, user_id)
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
-        
-        # Verify current password
-        if not crud.verify_password(user, pwd_change.currentPassword):
-            raise HTTPException(status_code=401, detail="Current password is incorrect")
-        
-        # Update password
-        user = crud.change_password(db, user_id, pwd_change.newPassword)
+        async with auth_slot("change_password"):
+            user = await crud_async.get_user_by_id(db, user_id)
+            if not user:
+                raise HTTPException(status_code=404, detail="User not found")
+            
+            # Verify current password
+            if not await crud_async.verify_password(user, pwd_change.currentPassword):
+                raise HTTPException(status_code=401, detail="Current password is incorrect")
+            
+            # Update password
+            user = await crud_async.change_password(db, user_id, pwd_change.newPassword)
         
         # Log event
-        crud.log_event(db, user_id, "password_change", {})
+        await crud_async.log_event(db, user_id, "password_change", {})
         
         return {
             "status": "success",
@@ -465,12 +719,14 @@ def change_password(user_id: str, pwd_change: ChangePassword, db: Session = Depe
         }
     except HTTPException:
         raise
+    except AuthOverloadedError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Password change failed: {str(e)}")
 
 
 @app.delete("/api/users/{user_id}")
-def delete_account(user_id: str, db: Session = Depends(get_db)):
+def delete_account(user_id: str, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
     """Delete user account"""
     try:
         user = crud.get_user_by_id(db, user_id)
@@ -480,6 +736,14 @@ def delete_account(user_id: str, db: Session = Depends(get_db)):
         # Log event before deletion
         crud.log_event(db, user_id, "account_deleted", {})
         
+        # Heavy accounts are deleted in the background so the request returns immediately
+        if crud.count_user_messages(db, user_id) > BACKGROUND_DELETE_THRESHOLD:
+            background_tasks.add_task(delete_user_in_background, user_id)
+            return {
+                "status": "accepted",
+                "message": "Account deletion scheduled"
+            }
+        
         # Delete user and all related data
         crud.delete_user(db, user_id)
         
@@ -493,48 +757,71 @@ def delete_account(user_id: str, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=f"Account deletion failed: {str(e)}")
 
 
+def delete_user_in_background(user_id: str):
+    """Run a large account deletion outside the request"""
+    with get_db_context() as db:
+        if not crud.delete_user(db, user_id):
+            logger.warning("Background deletion failed", extra={"user_id": user_id})
+
+
 @app.post("/api/users/{user_id}/sessions")
-def create_session(user_id: str, session_data: ChatSessionCreate, db: Session = Depends(get_db)):
+async def create_session(user_id: str, session_data: ChatSessionCreate, db: AsyncSession = Depends(get_async_db)):
     """Create a new chat session"""
     try:
-        session = crud.create_chat_session(db, user_id, session_data.title)
+        session = await crud_async.create_chat_session(db, user_id, session_data.title)
         return {
             "status": "success",
-            "session": session.to_dict()
+            "session": session.to_dict(message_count=0)
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to create session: {str(e)}")
 
 
 @app.get("/api/users/{user_id}/sessions")
-def get_user_sessions(user_id: str, db: Session = Depends(get_db)):
-    """Get all chat sessions for a user"""
+async def get_user_sessions(
+    user_id: str,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get a page of chat sessions for a user, most recently updated first"""
     try:
-        sessions = crud.get_user_chat_sessions(db, user_id)
+        sessions = await crud_async.get_user_chat_sessions_with_counts(db, user_id, limit, cursor)
         return {
-            "sessions": [session.to_dict() for session in sessions]
+            "sessions": [session.to_dict(message_count=count) for session, count in sessions],
+            "nextCursor": crud.next_cursor([session for session, _ in sessions], limit, "updated_at")
         }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to retrieve sessions: {str(e)}")
 
 
 @app.get("/api/sessions/{session_id}/messages")
-def get_session_messages(session_id: str, db: Session = Depends(get_db)):
-    """Get all messages in a session"""
+async def get_session_messages(
+    session_id: str,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get a page of messages in a session, oldest first"""
     try:
-        messages = crud.get_session_messages(db, session_id)
+        messages = await crud_async.get_session_messages(db, session_id, limit, cursor)
         return {
-            "messages": [msg.to_dict() for msg in messages]
+            "messages": [msg.to_dict() for msg in messages],
+            "nextCursor": crud.next_cursor(messages, limit, "created_at")
         }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to retrieve messages: {str(e)}")
 
 
 @app.delete("/api/sessions/{session_id}")
-def delete_session(session_id: str, db: Session = Depends(get_db)):
+async def delete_session(session_id: str, db: AsyncSession = Depends(get_async_db)):
     """Delete a chat session"""
     try:
-        deleted = crud.delete_chat_session(db, session_id)
+        deleted = await crud_async.delete_chat_session(db, session_id)
         if not deleted:
             raise HTTPException(status_code=404, detail="Session not found")
         return {"status": "success", "message": "Session deleted"}
@@ -545,13 +832,14 @@ def delete_session(session_id: str, db: Session = Depends(get_db)):
 
 
 @app.put("/api/sessions/{session_id}/title")
-def update_session_title(session_id: str, session_data: ChatSessionUpdate, db: Session = Depends(get_db)):
+async def update_session_title(session_id: str, session_data: ChatSessionUpdate, db: AsyncSession = Depends(get_async_db)):
     """Update the title of a chat session"""
     try:
-        session = crud.update_chat_session_title(db, session_id, session_data.title)
+        session = await crud_async.update_chat_session_title(db, session_id, session_data.title)
         if not session:
             raise HTTPException(status_code=404, detail="Session not found")
-        return {"status": "success", "session": session.to_dict()}
+        message_count = await crud_async.count_session_messages(db, session_id)
+        return {"status": "success", "session": session.to_dict(message_count=message_count)}
     except HTTPException:
         raise
     except Exception as e:
@@ -559,22 +847,30 @@ def update_session_title(session_id: str, session_data: ChatSessionUpdate, db: S
 
 
 @app.get("/api/users/{user_id}/documents")
-def get_user_documents(user_id: str, db: Session = Depends(get_db)):
-    """Get all documents for a user"""
+def get_user_documents(
+    user_id: str,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """Get a page of documents for a user, newest first"""
     try:
-        documents = crud.get_user_documents(db, user_id)
+        documents = crud.get_user_documents(db, user_id, limit, cursor)
         return {
-            "documents": [doc.to_dict() for doc in documents]
+            "documents": [doc.to_dict() for doc in documents],
+            "nextCursor": crud.next_cursor(documents, limit, "uploaded_at")
         }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to retrieve documents: {str(e)}")
 
 
 @app.post("/api/users/{user_id}/saved-messages")
-def save_message(user_id: str, message_data: SavedMessageCreate, db: Session = Depends(get_db)):
+async def save_message(user_id: str, message_data: SavedMessageCreate, db: AsyncSession = Depends(get_async_db)):
     """Save a message for later reference"""
     try:
-        saved = crud.save_message(
+        saved = await crud_async.save_message(
             db, user_id, message_data.messageId, message_data.content,
             message_data.note, message_data.tags
         )
@@ -587,22 +883,30 @@ def save_message(user_id: str, message_data: SavedMessageCreate, db: Session = D
 
 
 @app.get("/api/users/{user_id}/saved-messages")
-def get_saved_messages(user_id: str, db: Session = Depends(get_db)):
-    """Get all saved messages for a user"""
+async def get_saved_messages(
+    user_id: str,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get a page of saved messages for a user, newest first"""
     try:
-        messages = crud.get_user_saved_messages(db, user_id)
+        messages = await crud_async.get_user_saved_messages(db, user_id, limit, cursor)
         return {
-            "messages": [msg.to_dict() for msg in messages]
+            "messages": [msg.to_dict() for msg in messages],
+            "nextCursor": crud.next_cursor(messages, limit, "saved_at")
         }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to retrieve saved messages: {str(e)}")
 
 
 @app.delete("/api/saved-messages/{saved_id}")
-def delete_saved_message(saved_id: str, db: Session = Depends(get_db)):
+async def delete_saved_message(saved_id: str, db: AsyncSession = Depends(get_async_db)):
     """Delete a saved message"""
     try:
-        deleted = crud.delete_saved_message(db, saved_id)
+        deleted = await crud_async.delete_saved_message(db, saved_id)
         if not deleted:
             raise HTTPException(status_code=404, detail="Saved message not found")
         return {"status": "success", "message": "Saved message deleted"}
@@ -613,32 +917,54 @@ def delete_saved_message(saved_id: str, db: Session = Depends(get_db)):
 
 
 @app.get("/api/analytics/summary")
-def get_analytics_summary(days: int = 7, db: Session = Depends(get_db)):
-    """Get overall analytics summary"""
+async def get_analytics_summary(request: Request, days: int = Query(7, ge=1, le=MAX_ANALYTICS_DAYS), db: AsyncSession = Depends(get_async_db)):
+    """Get overall analytics summary (cached, supports ETag/If-Modified-Since)"""
     try:
-        summary = crud.get_analytics_summary(db, days)
-        return summary
+        entry = await analytics_cache.get_or_compute(
+            ("summary", days), lambda: crud_async.get_analytics_summary(db, days)
+        )
+        return cached_json_response(request, entry, ANALYTICS_CACHE_TTL)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get analytics: {str(e)}")
 
 
 @app.get("/api/analytics/query-distribution")
-def get_query_distribution(days: int = 7, db: Session = Depends(get_db)):
-    """Get query distribution over time"""
+async def get_query_distribution(request: Request, days: int = Query(7, ge=1, le=MAX_ANALYTICS_DAYS), db: AsyncSession = Depends(get_async_db)):
+    """Get query distribution over time (cached, supports ETag/If-Modified-Since)"""
     try:
-        distribution = crud.get_query_distribution(db, days)
-        return distribution
+        entry = await analytics_cache.get_or_compute(
+            ("query-distribution", days), lambda: crud_async.get_query_distribution(db, days)
+        )
+        return cached_json_response(request, entry, ANALYTICS_CACHE_TTL)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get distribution: {str(e)}")
 
 
+@app.get("/api/analytics/latency")
+async def get_latency_percentiles(days: int = Query(7, ge=1, le=MAX_ANALYTICS_DAYS), db: AsyncSession = Depends(get_async_db)):
+    """Get p50/p95/p99 latency per pipeline stage (ms) for recent chat responses"""
+    try:
+        return await crud_async.get_latency_percentiles(db, days)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get latency stats: {str(e)}")
+
+
 @app.get("/api/users/{user_id}/analytics")
-def get_user_analytics(user_id: str, days: int = 30, db: Session = Depends(get_db)):
-    """Get analytics for a specific user"""
+async def get_user_analytics(
+    user_id: str,
+    days: int = Query(30, ge=1, le=MAX_ANALYTICS_DAYS),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get a page of analytics events for a specific user, newest first"""
     try:
-        analytics = crud.get_user_analytics(db, user_id, days)
+        analytics = await crud_async.get_user_analytics(db, user_id, days, limit, cursor)
         return {
-            "analytics": [event.to_dict() for event in analytics]
+            "analytics": [event.to_dict() for event in analytics],
+            "nextCursor": crud.next_cursor(analytics, limit, "timestamp")
         }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get user analytics: {str(e)}")
@@ -3,10 +3,11 @@ Database models for ARTH-MITRA
 Using SQLAlchemy ORM with SQLite for development
 """
 
-from sqlalchemy import Column, Integer, String, Text, DateTime, Float, Boolean, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, Text, DateTime, Float, Boolean, ForeignKey, JSON, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
+from typing import Optional
 import uuid
 
 Base = declarative_base()
@@ -75,6 +76,9 @@ class User(Base):
 class ChatSession(Base):
     """Chat session for grouping messages"""
     __tablename__ = "chat_sessions"
+    __table_args__ = (
+        Index('ix_chat_sessions_user_updated', 'user_id', 'updated_at'),  # Keyset pagination
+    )
     
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     user_id = Column(String, ForeignKey("users.id"), nullable=False, index=True)
@@ -87,7 +91,10 @@ class ChatSession(Base):
     user = relationship("User", back_populates="chat_sessions")
     messages = relationship("ChatMessage", back_populates="session", cascade="all, delete-orphan")
     
-    def to_dict(self):
+    def to_dict(self, message_count: Optional[int] = None):
+        # Pass message_count from an aggregate query to avoid loading every message
+        if message_count is None:
+            message_count = len(self.messages) if self.messages else 0
         return {
             "id": self.id,
             "userId": self.user_id,
@@ -95,13 +102,16 @@ class ChatSession(Base):
             "createdAt": self.created_at.isoformat(),
             "updatedAt": self.updated_at.isoformat(),
             "isActive": self.is_active,
-            "messageCount": len(self.messages) if self.messages else 0
+            "messageCount": message_count
         }
 
 
 class ChatMessage(Base):
     """Individual chat messages"""
     __tablename__ = "chat_messages"
+    __table_args__ = (
+        Index('ix_chat_messages_session_created', 'session_id', 'created_at'),  # Keyset pagination
+    )
     
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     session_id = Column(String, ForeignKey("chat_sessions.id"), nullable=False, index=True)
@@ -113,6 +123,7 @@ class ChatMessage(Base):
     response_time = Column(Float)  # in seconds
     tokens_used = Column(Integer)
     cached = Column(Boolean, default=False)
+    timings = Column(JSON)  # Per-stage latency breakdown in ms (cache_lookup, retrieval, llm_generation, ttft, ...)
     
     # Metadata
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -130,6 +141,7 @@ class ChatMessage(Base):
             "responseTime": self.response_time,
             "tokensUsed": self.tokens_used,
             "cached": self.cached,
+            "timings": self.timings,
             "createdAt": self.created_at.isoformat()
         }
 
@@ -137,6 +149,9 @@ class ChatMessage(Base):
 class Document(Base):
     """Uploaded documents"""
     __tablename__ = "documents"
+    __table_args__ = (
+        Index('ix_documents_user_uploaded', 'user_id', 'uploaded_at'),  # Keyset pagination
+    )
     
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     user_id = Column(String, ForeignKey("users.id"), nullable=False, index=True)
@@ -144,7 +159,9 @@ class Document(Base):
     file_path = Column(String, nullable=False)
     file_type = Column(String, nullable=False)
     file_size = Column(Integer)  # in bytes
+    content_hash = Column(String(64), index=True)  # SHA-256; uploads with equal content share file and chunks
     chunks_indexed = Column(Integer, default=0)
+    chunk_ids = Column(JSON)  # Vector store IDs of this content's chunks (shared by equal content_hash)
     
     # Metadata
     uploaded_at = Column(DateTime, default=datetime.utcnow)
@@ -160,6 +177,7 @@ class Document(Base):
             "filename": self.filename,
             "fileType": self.file_type,
             "fileSize": self.file_size,
+            "contentHash": self.content_hash,
             "chunksIndexed": self.chunks_indexed,
             "isIndexed": self.is_indexed,
             "uploadedAt": self.uploaded_at.isoformat()
@@ -169,6 +187,9 @@ class Document(Base):
 class SavedMessage(Base):
     """User-saved important messages"""
     __tablename__ = "saved_messages"
+    __table_args__ = (
+        Index('ix_saved_messages_user_saved', 'user_id', 'saved_at'),  # Keyset pagination
+    )
     
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     user_id = Column(String, ForeignKey("users.id"), nullable=False, index=True)
@@ -198,6 +219,9 @@ class SavedMessage(Base):
 class Analytics(Base):
     """Analytics and usage statistics"""
     __tablename__ = "analytics"
+    __table_args__ = (
+        Index('ix_analytics_user_timestamp', 'user_id', 'timestamp'),  # Keyset pagination
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(String, ForeignKey("users.id"), index=True)
@@ -215,3 +239,31 @@ class Analytics(Base):
             "eventData": self.event_data,
             "timestamp": self.timestamp.isoformat()
         }
+
+
+class AnalyticsRollupMixin:
+    """Pre-aggregated counters for one (bucket, event type) pair"""
+    bucket_start = Column(DateTime, primary_key=True)
+    event_type = Column(String, primary_key=True)  # Analytics event types plus 'chat_message:<role>'
+    event_count = Column(Integer, nullable=False, default=0)
+    response_time_sum = Column(Float, nullable=False, default=0.0)
+    response_time_count = Column(Integer, nullable=False, default=0)
+    cached_count = Column(Integer, nullable=False, default=0)
+
+
+class AnalyticsHourlyRollup(AnalyticsRollupMixin, Base):
+    """Hourly analytics counters, updated on every event write"""
+    __tablename__ = "analytics_rollup_hourly"
+
+
+class AnalyticsDailyRollup(AnalyticsRollupMixin, Base):
+    """Daily analytics counters, updated on every event write"""
+    __tablename__ = "analytics_rollup_daily"
+
+
+class AnalyticsDailyUser(Base):
+    """Users seen per day, for distinct active-user counts without scanning events"""
+    __tablename__ = "analytics_daily_users"
+    
+    day = Column(DateTime, primary_key=True)
+    user_id = Column(String, primary_key=True)
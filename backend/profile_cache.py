@@ -0,0 +1,90 @@
+"""
+Short-lived user profile cache for chat personalization
+Lets chat requests send only userId; invalidated by profile updates and account deletion
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+PROFILE_CACHE_TTL = float(os.getenv("PROFILE_CACHE_TTL", "300"))  # seconds
+PROFILE_CACHE_SIZE = int(os.getenv("PROFILE_CACHE_SIZE", "1000"))
+
+# User.to_dict keys that make up the chat personalization profile (same names as UserProfile)
+PROFILE_FIELDS = (
+    "age", "gender", "income", "employmentStatus", "taxRegime", "homeownerStatus",
+    "children", "childrenAges", "parentsAge", "investmentCapacity", "riskAppetite",
+    "financialGoals", "existingInvestments",
+)
+
+
+class UserProfileCache:
+    """Thread-safe LRU cache of user rows and their chat profiles with TTL"""
+
+    def __init__(self, ttl: float = PROFILE_CACHE_TTL, max_size: int = PROFILE_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0  # Bumped by invalidate/clear; loads started before a bump are not cached
+
+    def get(self, user_id: str) -> Optional[Dict]:
+        """Cached entry for user_id, or None if missing/expired"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            if time.monotonic() - entry["cached_at"] >= self.ttl:
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return entry
+
+    def generation(self) -> int:
+        """Read before loading a user on a miss and pass to set()"""
+        with self._lock:
+            return self._generation
+
+    def set(self, user_id: str, user_dict: Dict, generation: Optional[int] = None) -> Dict:
+        """
+        Cache a User.to_dict() result; the chat profile keeps only filled-in fields.
+        If an invalidation happened since generation was read, the entry is returned but not cached.
+        """
+        entry = {
+            "user": user_dict,
+            "profile": {key: user_dict[key] for key in PROFILE_FIELDS if user_dict.get(key) is not None},
+            "cached_at": time.monotonic(),
+        }
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return entry
+            self._entries[user_id] = entry
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return entry
+
+    def profile_text(self, entry: Dict, render: Callable[[Dict], str]) -> str:
+        """Formatted profile block for an entry, rendered once"""
+        with self._lock:
+            if "profile_text" not in entry:
+                entry["profile_text"] = render(entry["profile"])
+            return entry["profile_text"]
+
+    def invalidate(self, user_id: str):
+        """Drop a user's cached profile"""
+        with self._lock:
+            self._generation += 1
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        """Drop all cached profiles"""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+
+# Global profile cache instance
+profile_cache = UserProfileCache()
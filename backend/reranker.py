@@ -0,0 +1,139 @@
+"""
+Optional cross-encoder reranking of retrieved chunks
+The bi-encoder retriever fetches a wider candidate set; a small CPU cross-encoder
+scores (query, chunk) pairs in batches and only the best few chunks go to the LLM.
+Scores are cached per (query, chunk), and scoring stops when the time budget is
+spent, falling back to first-stage order for candidates that were not scored.
+Enabled with RERANKER_ENABLED=1 (needs sentence-transformers).
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from logging_config import get_logger
+
+RERANKER_MODEL = os.getenv("RERANKER_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "12"))  # First-stage chunks scored per query
+RERANK_TOP_N = int(os.getenv("RERANK_TOP_N", "3"))  # Chunks kept for the prompt
+RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", "150"))  # Stop scoring new batches after this
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "8"))
+RERANK_CACHE_SIZE = int(os.getenv("RERANK_CACHE_SIZE", "5000"))  # (query, chunk) scores kept
+
+logger = get_logger("reranker")
+
+
+def reranker_enabled() -> bool:
+    return os.getenv("RERANKER_ENABLED", "").lower() in ("1", "true", "yes")
+
+
+def normalize_query(query: str) -> str:
+    """Case, whitespace and trailing punctuation don't change what a query retrieves"""
+    return " ".join(query.lower().split()).rstrip("?!. ")
+
+
+def chunk_key(doc: Document) -> str:
+    """Vector store ID when available, otherwise a hash of source and text"""
+    if getattr(doc, "id", None):
+        return doc.id
+    key = f"{doc.metadata.get('source', '')}\0{doc.page_content}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+
+
+class ScoreCache:
+    """Thread-safe LRU of cross-encoder scores keyed by (normalized query, chunk key)"""
+
+    def __init__(self, max_size: int = RERANK_CACHE_SIZE):
+        self.max_size = max_size
+        self._scores: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple[str, str]) -> Optional[float]:
+        with self._lock:
+            score = self._scores.get(key)
+            if score is not None:
+                self._scores.move_to_end(key)
+            return score
+
+    def set(self, key: Tuple[str, str], score: float) -> None:
+        with self._lock:
+            self._scores[key] = score
+            self._scores.move_to_end(key)
+            while len(self._scores) > self.max_size:
+                self._scores.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._scores.clear()
+
+
+class Reranker:
+    """Batched cross-encoder reranker with a per-query time budget"""
+
+    def __init__(
+        self,
+        model=None,
+        top_n: int = RERANK_TOP_N,
+        budget_ms: float = RERANK_BUDGET_MS,
+        batch_size: int = RERANK_BATCH_SIZE,
+        cache_size: int = RERANK_CACHE_SIZE
+    ):
+        if model is None:
+            from sentence_transformers import CrossEncoder
+            model = CrossEncoder(RERANKER_MODEL, device="cpu")
+        self.model = model
+        self.top_n = top_n
+        self.budget = budget_ms / 1000
+        self.batch_size = batch_size
+        self.cache = ScoreCache(cache_size)
+
+    def warm_up(self) -> None:
+        """Run one prediction so the first user query doesn't pay for lazy initialization"""
+        self.model.predict([("warm up", "warm up")], batch_size=1)
+
+    def rerank(self, query: str, docs: List[Document]) -> List[Document]:
+        """Best top_n docs by cross-encoder score; unscored docs keep first-stage order after scored ones"""
+        if len(docs) <= self.top_n:
+            return docs
+
+        normalized = normalize_query(query)
+        keys = [(normalized, chunk_key(doc)) for doc in docs]
+        scores: List[Optional[float]] = [self.cache.get(key) for key in keys]
+        pending = [index for index, score in enumerate(scores) if score is None]
+
+        deadline = time.perf_counter() + self.budget
+        for start in range(0, len(pending), self.batch_size):
+            if start and time.perf_counter() >= deadline:
+                logger.debug("Rerank budget spent", extra={"scored": start, "pending": len(pending) - start})
+                break
+            batch = pending[start:start + self.batch_size]
+            predicted = self.model.predict([(query, docs[index].page_content) for index in batch], batch_size=self.batch_size)
+            for index, score in zip(batch, predicted):
+                scores[index] = float(score)
+                self.cache.set(keys[index], scores[index])
+
+        scored = sorted((index for index, score in enumerate(scores) if score is not None), key=lambda index: -scores[index])
+        unscored = [index for index, score in enumerate(scores) if score is None]
+        return [docs[index] for index in (scored + unscored)[:self.top_n]]
+
+
+def create_reranker() -> Optional[Reranker]:
+    """Reranker if enabled and sentence-transformers is installed, else None"""
+    if not reranker_enabled():
+        return None
+    try:
+        reranker = Reranker()
+        reranker.warm_up()
+    except ImportError:
+        logger.warning("RERANKER_ENABLED is set but sentence-transformers is not installed; reranking disabled")
+        return None
+    except Exception as e:
+        logger.warning("Failed to load reranker; reranking disabled", extra={"model": RERANKER_MODEL, "error": str(e)})
+        return None
+    logger.info("Reranker ready", extra={"model": RERANKER_MODEL, "top_n": reranker.top_n, "budget_ms": RERANK_BUDGET_MS})
+    return reranker
@@ -0,0 +1,80 @@
+"""
+Password hashing on a bounded worker pool
+bcrypt costs 100-300 ms of CPU per call, so it runs off the event loop on a
+fixed number of threads (bcrypt releases the GIL) and auth endpoints are
+concurrency-limited, keeping login storms from starving chat requests.
+"""
+
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Dict
+
+import bcrypt
+
+# Hashing configuration
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))  # Existing hashes with another cost are rehashed on login
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# Max concurrent requests per auth endpoint, and how long extra requests may queue
+AUTH_CONCURRENCY: Dict[str, int] = {
+    "register": int(os.getenv("AUTH_CONCURRENCY_REGISTER", "4")),
+    "login": int(os.getenv("AUTH_CONCURRENCY_LOGIN", "8")),
+    "change_password": int(os.getenv("AUTH_CONCURRENCY_CHANGE_PASSWORD", "2")),
+}
+AUTH_QUEUE_TIMEOUT = float(os.getenv("AUTH_QUEUE_TIMEOUT", "5"))
+
+_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+
+class AuthOverloadedError(Exception):
+    """Raised when an auth endpoint has no free slot within AUTH_QUEUE_TIMEOUT"""
+
+
+def hash_password_sync(password: str) -> str:
+    """Hash a password with the configured cost (blocking)"""
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode('utf-8')
+
+
+def check_password_sync(password: str, password_hash: str) -> bool:
+    """Verify a password against its hash (blocking)"""
+    return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+
+
+async def hash_password(password: str) -> str:
+    """Hash a password on the bounded worker pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, hash_password_sync, password)
+
+
+async def check_password(password: str, password_hash: str) -> bool:
+    """Verify a password on the bounded worker pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, check_password_sync, password, password_hash)
+
+
+def needs_rehash(password_hash: str) -> bool:
+    """True if a bcrypt hash was made with a cost other than BCRYPT_ROUNDS"""
+    try:
+        # Format: $2b$<cost>$<salt+hash>
+        return int(password_hash.split('$')[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return False
+
+
+@asynccontextmanager
+async def auth_slot(endpoint: str):
+    """Hold one of the endpoint's concurrency slots for the duration of the block"""
+    semaphore = _semaphores.get(endpoint)
+    if semaphore is None:
+        semaphore = _semaphores.setdefault(endpoint, asyncio.Semaphore(AUTH_CONCURRENCY.get(endpoint, 4)))
+    try:
+        await asyncio.wait_for(semaphore.acquire(), timeout=AUTH_QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise AuthOverloadedError(f"Too many concurrent {endpoint} requests")
+    try:
+        yield
+    finally:
+        semaphore.release()
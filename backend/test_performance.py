@@ -50,6 +50,24 @@ def test_query(query, profile=None, test_name="Query"):
         print(f"❌ {test_name} error: {e}")
         return None
 
+def test_gold_price_query():
+    """Dated gold price questions are answered from gold_data.csv without the LLM"""
+    cases = [
+        ("What was the gold price on 30/09/2015?", "Here is the gold price data"),
+        ("Gold rate on 27 September 2015", "I don't have gold price data"),  # Weekend: nearest date
+        ("Gold price on 1 January 1990", "The available data ranges from"),  # Outside the data
+    ]
+    passed = 0
+    for query, expected in cases:
+        response = requests.post(f"{BASE_URL}/api/chat", json={"message": query, "history": []})
+        data = response.json() if response.status_code == 200 else {}
+        if data.get("sources") == ["gold_data.csv"] and expected in data.get("response", ""):
+            print(f"✅ {query}")
+            passed += 1
+        else:
+            print(f"❌ {query}: {response.status_code} {data.get('sources')}")
+    return passed == len(cases)
+
 def get_status():
     """Get bot status"""
     try:
@@ -151,6 +169,12 @@ def main():
     if t1 and t2:
         print(f"\n   Profile query speedup: {t1/t2:.1f}x")
     
+    print("\n" + "=" * 60)
+    print("TEST 4: Gold price lookup")
+    print("=" * 60)
+    
+    test_gold_price_query()
+    
     print("\n" + "=" * 60)
     print("✅ TESTING COMPLETE")
     print("=" * 60)
@@ -0,0 +1,118 @@
+"""
+Remove orphaned vectors from the Chroma index.
+
+Orphans are chunks whose source file is gone, upload chunks their document row no
+longer lists (left behind by a re-chunk), and - with --include-unreferenced-uploads -
+uploads that no document row points to.
+
+Usage (from the backend folder):
+    python tools/compact_index.py --dry-run                        # report only
+    python tools/compact_index.py                                  # delete missing-file and stale chunks
+    python tools/compact_index.py --include-unreferenced-uploads   # also delete unreferenced uploads
+
+Restart a running server afterwards: its in-process retrieval cache is keyed on its own
+index version, which this script cannot bump, so cached results can still cite deleted chunks.
+"""
+import argparse
+import os
+import sys
+from collections import Counter
+from typing import Dict, List, Set
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+
+DELETE_BATCH_SIZE = 500
+
+
+def find_orphans(
+    ids: List[str],
+    metadatas: List[Dict],
+    references: Dict[str, Set[str]],
+    upload_dir: str,
+    include_unreferenced_uploads: bool
+) -> Dict[str, List[str]]:
+    """
+    Orphaned vector IDs by reason:
+      missing_file - the source file no longer exists
+      stale_chunk  - an upload chunk its document rows no longer list (left by a re-chunk)
+      unreferenced - an upload no document row points to (only with include_unreferenced_uploads)
+    Knowledge-base documents are only removed when their file is gone.
+    """
+    upload_root = os.path.abspath(upload_dir)
+    orphans: Dict[str, List[str]] = {"missing_file": [], "stale_chunk": [], "unreferenced": []}
+
+    for vector_id, metadata in zip(ids, metadatas):
+        source = (metadata or {}).get("source")
+        if not source:
+            continue
+        if not os.path.exists(source):
+            orphans["missing_file"].append(vector_id)
+        elif os.path.commonpath([upload_root, os.path.abspath(source)]) != upload_root:
+            continue
+        elif source in references:
+            # Rows from before chunk IDs were recorded keep every chunk of their file
+            if references[source] and vector_id not in references[source]:
+                orphans["stale_chunk"].append(vector_id)
+        elif include_unreferenced_uploads:
+            orphans["unreferenced"].append(vector_id)
+    return orphans
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Remove orphaned vectors from the Chroma index")
+    parser.add_argument("--dry-run", action="store_true", help="Report orphans without deleting them")
+    parser.add_argument(
+        "--include-unreferenced-uploads", action="store_true",
+        help="Also remove uploads that no document row points to (anonymous uploads)"
+    )
+    args = parser.parse_args()
+
+    # Index, upload and SQLite paths are relative to the backend folder
+    os.chdir(BACKEND_DIR)
+    from langchain_chroma import Chroma
+    import crud
+    from bot import CHROMA_PERSIST_DIR
+    from database import get_db_context
+    from ingestion import UPLOAD_DIR
+
+    if not os.path.exists(CHROMA_PERSIST_DIR):
+        print(f"No index at {CHROMA_PERSIST_DIR}")
+        return
+
+    # No embedding function needed: vectors are only listed and deleted
+    vectorstore = Chroma(persist_directory=CHROMA_PERSIST_DIR)
+    contents = vectorstore.get(include=["metadatas"])
+    with get_db_context() as db:
+        references = crud.get_chunk_references(db)
+
+    orphans = find_orphans(contents["ids"], contents["metadatas"], references, UPLOAD_DIR, args.include_unreferenced_uploads)
+    to_delete = [vector_id for vector_ids in orphans.values() for vector_id in vector_ids]
+
+    print(f"Vectors in index: {len(contents['ids'])}")
+    for reason, vector_ids in orphans.items():
+        print(f"  {reason}: {len(vector_ids)}")
+    deleting = set(to_delete)
+    sources = Counter(
+        os.path.basename(metadata.get("source", "?"))
+        for vector_id, metadata in zip(contents["ids"], contents["metadatas"])
+        if vector_id in deleting
+    )
+    for source, count in sources.most_common(10):
+        print(f"    {source}: {count}")
+
+    if not to_delete:
+        print("No orphaned vectors")
+        return
+    if args.dry_run:
+        print(f"Dry run: {len(to_delete)} vectors would be deleted")
+        return
+
+    for start in range(0, len(to_delete), DELETE_BATCH_SIZE):
+        vectorstore.delete(ids=to_delete[start:start + DELETE_BATCH_SIZE])
+    print(f"Deleted {len(to_delete)} orphaned vectors ({len(contents['ids']) - len(to_delete)} remain)")
+    print("Restart the server so its retrieval cache drops results that cite deleted chunks")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+import argparse
+import json
+import math
+import os
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ENDPOINTS = {
+    "chat": "/api/chat",
+    "stream": "/api/chat/stream",
+}
+
+PROFILE = {
+    "age": 30,
+    "income": "₹10 LPA",
+    "employmentStatus": "Salaried",
+    "taxRegime": "Old Regime",
+    "homeownerStatus": "Rented",
+}
+
+
+def load_queries(path: str) -> List[str]:
+    if not path:
+        return [
+            "What are the benefits and eligibility of PPF?",
+            "How does SCSS work and what is the interest rate?",
+            "Explain Sukanya Samriddhi Account Scheme rules",
+            "What is the latest income tax slab for FY 2025-26?",
+            "Compare PPF vs NSC for a salaried person",
+            "What schemes are available for senior citizens?",
+            "How does 80C deduction work?",
+            "Tell me about NPS scheme",
+        ]
+
+    with open(path, "r", encoding="utf-8") as handle:
+        if path.endswith(".json"):
+            payload = json.load(handle)
+            if isinstance(payload, list):
+                return [str(item) for item in payload]
+            if isinstance(payload, dict) and "queries" in payload:
+                return [str(item) for item in payload["queries"]]
+            raise ValueError("Unsupported JSON format. Use a list or { 'queries': [...] }.")
+
+        return [line.strip() for line in handle if line.strip()]
+
+
+def post_json(url: str, payload: Dict, timeout: float):
+    request = urllib.request.Request(
+        url,
+        data=json.dumps(payload).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+    return urllib.request.urlopen(request, timeout=timeout)
+
+
+def run_request(base_url: str, endpoint: str, query: str, scheduled: float, timeout: float) -> Dict:
+    """Send one request; latencies are measured from the scheduled send time"""
+    payload = {"message": query, "profile": PROFILE, "history": []}
+    result = {"endpoint": endpoint, "query": query, "ok": False, "error": None, "ttft_ms": None, "latency_ms": None, "tokens": 0, "cached": None}
+    start = time.perf_counter()
+    result["queue_ms"] = (start - scheduled) * 1000
+
+    try:
+        with post_json(base_url + ENDPOINTS[endpoint], payload, timeout) as response:
+            # Servers without the header (older builds) leave cached as None
+            cache_header = response.headers.get("X-Cache")
+            if cache_header:
+                result["cached"] = cache_header == "hit"
+            if endpoint == "chat":
+                body = json.loads(response.read())
+                result["ttft_ms"] = (time.perf_counter() - scheduled) * 1000
+                result["ok"] = bool(body.get("response"))
+            else:
+                event = None
+                for raw_line in response:
+                    line = raw_line.decode("utf-8").rstrip("\n")
+                    if line.startswith("event: "):
+                        event = line[len("event: "):]
+                    elif line.startswith("data: "):
+                        if event == "token":
+                            if result["ttft_ms"] is None:
+                                result["ttft_ms"] = (time.perf_counter() - scheduled) * 1000
+                            result["tokens"] += 1
+                        elif event == "error":
+                            result["error"] = "stream_error"
+                        elif event == "done":
+                            break
+                result["ok"] = result["error"] is None and result["tokens"] > 0
+                if not result["ok"] and result["error"] is None:
+                    result["error"] = "empty_stream"
+    except urllib.error.HTTPError as e:
+        result["error"] = f"http_{e.code}"
+    except (urllib.error.URLError, TimeoutError, ConnectionError) as e:
+        result["error"] = type(getattr(e, "reason", e)).__name__
+    except Exception as e:
+        result["error"] = type(e).__name__
+
+    result["latency_ms"] = (time.perf_counter() - scheduled) * 1000
+    return result
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return round(ordered[rank - 1], 2)
+
+
+def summarize(results: List[Dict], wall_seconds: float) -> Dict:
+    ok = [item for item in results if item["ok"]]
+    latencies = [item["latency_ms"] for item in ok]
+    ttfts = [item["ttft_ms"] for item in ok if item["ttft_ms"] is not None]
+    errors: Dict[str, int] = {}
+    for item in results:
+        if not item["ok"]:
+            errors[item["error"]] = errors.get(item["error"], 0) + 1
+
+    return {
+        "requests": len(results),
+        "succeeded": len(ok),
+        "errors": errors,
+        "error_rate": round((len(results) - len(ok)) / len(results) * 100, 2) if results else 0,
+        "throughput_rps": round(len(ok) / wall_seconds, 2) if wall_seconds > 0 else None,
+        "avg_latency_ms": round(statistics.mean(latencies), 2) if latencies else None,
+        "p50_latency_ms": percentile(latencies, 50),
+        "p95_latency_ms": percentile(latencies, 95),
+        "p99_latency_ms": percentile(latencies, 99),
+        "max_latency_ms": round(max(latencies), 2) if latencies else None,
+        "p50_ttft_ms": percentile(ttfts, 50),
+        "p95_ttft_ms": percentile(ttfts, 95),
+        "p99_ttft_ms": percentile(ttfts, 99),
+        "avg_queue_ms": round(statistics.mean([item["queue_ms"] for item in results]), 2) if results else None,
+    }
+
+
+def run_load(
+    base_url: str, endpoints: List[str], queries: List[str], total: int, concurrency: int, rate: float, seed: int,
+    timeout: float, unique_tag: str = ""
+) -> List[Dict]:
+    """
+    Closed loop (rate=0): `concurrency` workers send back-to-back.
+    Open loop (rate>0): Poisson arrivals at `rate` req/s, at most `concurrency` in flight;
+    latency counts time spent waiting for a free slot, so overload is not hidden.
+    With unique_tag every query gets a suffix of its own, so none can be served from a cache.
+    """
+    rng = random.Random(seed)
+    plan = [(endpoints[i % len(endpoints)], queries[i % len(queries)]) for i in range(total)]
+    if unique_tag:
+        plan = [(endpoint, f"{query} (ref {unique_tag}-{i})") for i, (endpoint, query) in enumerate(plan)]
+    rng.shuffle(plan)
+
+    results: List[Dict] = []
+    lock = threading.Lock()
+
+    def record(future):
+        with lock:
+            results.append(future.result())
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        start = time.perf_counter()
+        next_send = start
+        for endpoint, query in plan:
+            if rate > 0:
+                next_send += rng.expovariate(rate)
+                delay = next_send - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                scheduled = next_send
+            else:
+                scheduled = None
+            future = pool.submit(
+                lambda e=endpoint, q=query, s=scheduled: run_request(base_url, e, q, s or time.perf_counter(), timeout)
+            )
+            future.add_done_callback(record)
+    return results
+
+
+def wait_for_server(base_url: str, timeout: float) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(base_url + "/api/status", timeout=2):
+                return
+        except Exception:
+            time.sleep(0.5)
+    raise RuntimeError(f"Server at {base_url} did not become ready in {timeout}s")
+
+
+def spawn_server(port: int) -> subprocess.Popen:
+    """Start the API with the deterministic fake LLM on a local port"""
+    env = dict(os.environ, ARTH_FAKE_LLM="1", LOG_LEVEL=os.getenv("LOG_LEVEL", "WARNING"))
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+        env=env,
+    )
+
+
+def print_summary(name: str, summary: Dict) -> None:
+    print(f"\n=== {name} ===")
+    print(f"Requests: {summary['requests']} (ok {summary['succeeded']}, error rate {summary['error_rate']}%)")
+    if summary["errors"]:
+        print(f"Errors: {summary['errors']}")
+    print(f"Throughput: {summary['throughput_rps']} req/s")
+    print(f"Latency ms: avg {summary['avg_latency_ms']} | p50 {summary['p50_latency_ms']} | p95 {summary['p95_latency_ms']} | p99 {summary['p99_latency_ms']} | max {summary['max_latency_ms']}")
+    print(f"TTFT ms: p50 {summary['p50_ttft_ms']} | p95 {summary['p95_ttft_ms']} | p99 {summary['p99_ttft_ms']}")
+    print(f"Avg wait for a free slot ms: {summary['avg_queue_ms']}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Concurrent load test for /api/chat and /api/chat/stream")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000", help="Server to test")
+    parser.add_argument("--spawn", action="store_true", help="Start a local server with ARTH_FAKE_LLM=1 (offline, deterministic)")
+    parser.add_argument("--port", type=int, default=8765, help="Port for --spawn")
+    parser.add_argument("--endpoint", choices=["chat", "stream", "both"], default="both")
+    parser.add_argument("--queries", help="Path to queries file (.txt or .json)", default="")
+    parser.add_argument("--requests", type=int, default=100, help="Total requests")
+    parser.add_argument("--concurrency", type=int, default=8, help="Max requests in flight")
+    parser.add_argument("--rate", type=float, default=0.0, help="Arrival rate in req/s (0 = closed loop)")
+    parser.add_argument("--warmup", type=int, default=4, help="Requests sent before measuring")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Per-request timeout in seconds")
+    parser.add_argument("--seed", type=int, default=42, help="Seed for request order and arrivals")
+    parser.add_argument("--keep-cache", action="store_true", help="Do not clear the response cache before measuring")
+    parser.add_argument(
+        "--unique-queries", action="store_true",
+        help="Make every request's query unique so no answer comes from the response/stream caches"
+    )
+    parser.add_argument("--out", help="Optional JSON output path", default="")
+    args = parser.parse_args()
+
+    server = None
+    base_url = args.base_url.rstrip("/")
+    if args.spawn:
+        base_url = f"http://127.0.0.1:{args.port}"
+        server = spawn_server(args.port)
+
+    try:
+        wait_for_server(base_url, timeout=60)
+        endpoints = ["chat", "stream"] if args.endpoint == "both" else [args.endpoint]
+        queries = load_queries(args.queries)
+
+        if args.warmup:
+            run_load(base_url, endpoints, queries, args.warmup, min(args.concurrency, args.warmup), 0, args.seed, args.timeout)
+        if not args.keep_cache:
+            urllib.request.urlopen(urllib.request.Request(base_url + "/api/cache/clear", method="POST"), timeout=10).close()
+
+        unique_tag = f"{random.Random().getrandbits(32):08x}" if args.unique_queries else ""
+        start = time.perf_counter()
+        results = run_load(
+            base_url, endpoints, queries, args.requests, args.concurrency, args.rate, args.seed, args.timeout, unique_tag
+        )
+        wall_seconds = time.perf_counter() - start
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=10)
+
+    summaries = {"all": summarize(results, wall_seconds)}
+    for endpoint in endpoints:
+        summaries[endpoint] = summarize([item for item in results if item["endpoint"] == endpoint], wall_seconds)
+    # Cache hits replay stored answers; report them apart so they don't flatter LLM-path latency
+    for name, cached in (("cached", True), ("uncached", False)):
+        subset = [item for item in results if item["cached"] is cached]
+        if subset:
+            summaries[name] = summarize(subset, wall_seconds)
+
+    print(f"\nTarget: {base_url} | concurrency {args.concurrency} | rate {args.rate or 'closed loop'} | wall {wall_seconds:.2f}s")
+    for name, summary in summaries.items():
+        print_summary(name, summary)
+
+    if args.out:
+        payload = {
+            "config": {
+                "base_url": base_url,
+                "spawned_fake_llm": args.spawn,
+                "endpoint": args.endpoint,
+                "requests": args.requests,
+                "concurrency": args.concurrency,
+                "rate": args.rate,
+                "seed": args.seed,
+                "unique_queries": args.unique_queries,
+                "wall_seconds": round(wall_seconds, 3),
+            },
+            "summary": summaries,
+            "results": results,
+        }
+        with open(args.out, "w", encoding="utf-8") as handle:
+            json.dump(payload, handle, indent=2, ensure_ascii=False)
+        print(f"\nSaved report to: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,32 @@
 import argparse
 import json
 import os
+import shutil
 import statistics
 import sys
+import tempfile
 import time
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
-from bot import ArthMitraBot
+import bot as bot_module
+from bot import ArthMitraBot, build_prompt, find_documents, format_chat_history, format_context, format_user_profile
+from fake_llm import FakeLLM
+
+# Offline summary metrics checked against a baseline report (lower is better).
+# The retrieval_ms metrics share their meaning with online reports such as rag_eval_report.json.
+REGRESSION_METRICS = [
+    "index_build_ms",
+    "avg_query_embedding_ms",
+    "p95_query_embedding_ms",
+    "avg_vector_search_ms",
+    "p95_vector_search_ms",
+    "avg_prompt_assembly_ms",
+    "avg_retrieval_ms",
+    "median_retrieval_ms",
+    "p95_retrieval_ms",
+]
 
 
 def load_queries(path: str) -> List[str]:
@@ -47,7 +65,7 @@ def measure_query(bot: ArthMitraBot, query: str, profile: Dict) -> Tuple[Dict, L
     docs = []
     if bot._retriever is not None:
         start = time.perf_counter()
-        docs = bot._retriever.invoke(query)
+        docs = bot._retrieve(query, use_cache=False)
         retrieval_ms = (time.perf_counter() - start) * 1000
 
     start = time.perf_counter()
@@ -74,6 +92,116 @@ def measure_query(bot: ArthMitraBot, query: str, profile: Dict) -> Tuple[Dict, L
     }, sources
 
 
+def build_offline_bot(docs_dir: str, index_dir: str, bot: Optional[ArthMitraBot] = None, settings: Optional[Dict] = None) -> Tuple[ArthMitraBot, Dict]:
+    """
+    Bot with a stub LLM and a vector index built from docs_dir into index_dir.
+    Pass an existing bot to reuse its loaded embedding model; settings override
+    its chunking/retrieval attributes (chunk_size, retrieval_k, ...).
+    """
+    os.environ["ARTH_FAKE_LLM"] = "1"
+    os.environ.setdefault("HF_HUB_OFFLINE", "1")  # Use the locally cached embedding model only
+    bot_module.CHROMA_PERSIST_DIR = index_dir
+
+    bot = bot or ArthMitraBot()
+    for name, value in (settings or {}).items():
+        setattr(bot, name, value)
+    bot.initialize(auto_index=False)
+    bot.llm = FakeLLM(ttft_ms=0, token_delay_ms=0)
+
+    index_stats = {"index_build_ms": None, "files_indexed": 0, "chunks_indexed": bot.vectorstore._collection.count()}
+    if index_stats["chunks_indexed"] == 0:
+        start = time.perf_counter()
+        for file_path in sorted(find_documents(docs_dir)):
+            bot.add_documents(file_path)
+            index_stats["files_indexed"] += 1
+        index_stats["index_build_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        index_stats["chunks_indexed"] = bot.vectorstore._collection.count()
+    bot._create_rag_chain()
+    bot.clear_cache()
+    return bot, index_stats
+
+
+def measure_offline_query(bot: ArthMitraBot, query: str, profile: Dict) -> Dict:
+    """Time each retrieval-path stage separately, then the full pipeline with the stub LLM"""
+    docs = []
+    embedding_ms = search_ms = rerank_ms = None
+    if bot._retriever is not None:
+        search_kwargs = dict(bot._retriever.search_kwargs)
+        start = time.perf_counter()
+        embedding = bot.embeddings.embed_query(query)
+        embedding_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        if bot._retriever.search_type == "mmr":
+            docs = bot.vectorstore.max_marginal_relevance_search_by_vector(embedding, **search_kwargs)
+        else:
+            docs = bot.vectorstore.similarity_search_by_vector(embedding, k=search_kwargs.get("k", 4))
+        search_ms = (time.perf_counter() - start) * 1000
+
+        if bot.reranker is not None:
+            start = time.perf_counter()
+            docs = bot.reranker.rerank(query, docs)
+            rerank_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    context = format_context(docs)
+    build_prompt(query, format_user_profile(profile), format_chat_history(None), context)
+    prompt_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    result = bot.get_response(query, profile=profile)
+    total_ms = (time.perf_counter() - start) * 1000
+
+    sources = result.get("sources", [])
+    return {
+        "query": query,
+        "query_embedding_ms": embedding_ms,
+        "vector_search_ms": search_ms,
+        "rerank_ms": rerank_ms,
+        "prompt_assembly_ms": prompt_ms,
+        "retrieval_ms": embedding_ms + search_ms + (rerank_ms or 0) if embedding_ms is not None else None,
+        "context_tokens": len(context) // 4,
+        "total_ms": total_ms,
+        "source_count": len(sources),
+        "sources": sources,
+        "retrieved_docs": len(docs),
+        "retrieved_doc_sources": sorted({os.path.basename(doc.metadata.get("source", "Unknown")) for doc in docs}),
+        "response_chars": len(result.get("response", "")),
+        "used_default_sources": is_default_sources(sources),
+    }
+
+
+def summarize_stages(results: List[Dict]) -> Dict:
+    summary = {}
+    for stage in ("query_embedding_ms", "vector_search_ms", "rerank_ms", "prompt_assembly_ms", "context_tokens"):
+        values = [item[stage] for item in results if item.get(stage) is not None]
+        if not values:
+            continue
+        summary[f"avg_{stage}"] = round(statistics.mean(values), 3)
+        summary[f"median_{stage}"] = round(statistics.median(values), 3)
+        summary[f"p95_{stage}"] = round(statistics.quantiles(values, n=20)[-1], 3) if len(values) >= 2 else None
+    return summary
+
+
+def load_baseline(path: str) -> Dict:
+    with open(path, "r", encoding="utf-8") as handle:
+        payload = json.load(handle)
+    return payload.get("summary", payload)
+
+
+def check_regressions(summary: Dict, baseline: Dict, max_regression: float, min_delta_ms: float) -> List[str]:
+    """Metrics slower than baseline by more than max_regression (fraction) and min_delta_ms"""
+    failures = []
+    for metric in REGRESSION_METRICS:
+        current, previous = summary.get(metric), baseline.get(metric)
+        if current is None or previous is None:
+            continue
+        if current > previous * (1 + max_regression) and current - previous > min_delta_ms:
+            change = (current - previous) / previous * 100 if previous else float("inf")
+            failures.append(f"{metric}: {previous} -> {current} (+{change:.1f}%)")
+    return failures
+
+
 def summarize(results: List[Dict]) -> Dict:
     total_times = [item["total_ms"] for item in results]
     retrieval_times = [item["retrieval_ms"] for item in results if item["retrieval_ms"] is not None]
@@ -121,9 +249,22 @@ def main() -> None:
     parser = argparse.ArgumentParser(description="Quick RAG diagnostics for Arth-Mitra")
     parser.add_argument("--queries", help="Path to queries file (.txt or .json)", default="")
     parser.add_argument("--out", help="Optional JSON output path", default="")
+    parser.add_argument("--offline", action="store_true", help="Stub LLM, temporary index, per-stage timings (no API key or network)")
+    parser.add_argument("--docs", help="Documents folder for --offline", default=bot_module.DOCS_DIR)
+    parser.add_argument("--index-dir", help="Reuse/keep this index for --offline instead of a temporary one", default="")
+    parser.add_argument("--baseline", help="Baseline report JSON to check for regressions", default="")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="Allowed slowdown vs baseline as a fraction")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0, help="Ignore slowdowns smaller than this (timer noise)")
     args = parser.parse_args()
 
-    bot = ArthMitraBot().initialize(auto_index=True)
+    index_stats: Optional[Dict] = None
+    temp_index_dir = None
+    if args.offline:
+        index_dir = args.index_dir or tempfile.mkdtemp(prefix="rag_eval_index_")
+        temp_index_dir = None if args.index_dir else index_dir
+        bot, index_stats = build_offline_bot(args.docs, index_dir)
+    else:
+        bot = ArthMitraBot().initialize(auto_index=True)
     try:
         doc_count = bot.vectorstore._collection.count()
     except Exception:
@@ -141,16 +282,40 @@ def main() -> None:
     results = []
 
     for query in queries:
-        item, _ = measure_query(bot, query, profile)
+        if args.offline:
+            item = measure_offline_query(bot, query, profile)
+        else:
+            item, _ = measure_query(bot, query, profile)
         results.append(item)
         print(f"\nQuery: {query}")
         print(f"  Retrieval ms: {item['retrieval_ms']}")
+        if args.offline:
+            print(f"  Query embedding ms: {item['query_embedding_ms']}")
+            print(f"  Vector search ms: {item['vector_search_ms']}")
+            if item["rerank_ms"] is not None:
+                print(f"  Rerank ms: {item['rerank_ms']}")
+            print(f"  Prompt assembly ms: {item['prompt_assembly_ms']}")
         print(f"  Total ms: {item['total_ms']}")
         print(f"  Sources ({item['source_count']}): {', '.join(item['sources'])}")
 
+    if temp_index_dir:
+        shutil.rmtree(temp_index_dir, ignore_errors=True)
+
     summary = summarize(results)
+    if args.offline:
+        summary.update(index_stats)
+        summary.update(summarize_stages(results))
     print("\n=== RAG Summary ===")
+    print(f"Mode: {'offline (stub LLM, total ms excludes LLM time)' if args.offline else 'online'}")
     print(f"Documents indexed: {doc_count}")
+    if args.offline:
+        print(f"Index build ms: {summary['index_build_ms']} ({summary['files_indexed']} files, {summary['chunks_indexed']} chunks)")
+        print(f"Avg/P95 query embedding ms: {summary.get('avg_query_embedding_ms')} / {summary.get('p95_query_embedding_ms')}")
+        print(f"Avg/P95 vector search ms: {summary.get('avg_vector_search_ms')} / {summary.get('p95_vector_search_ms')}")
+        if summary.get("avg_rerank_ms") is not None:
+            print(f"Avg/P95 rerank ms: {summary.get('avg_rerank_ms')} / {summary.get('p95_rerank_ms')}")
+        print(f"Avg/P95 prompt assembly ms: {summary.get('avg_prompt_assembly_ms')} / {summary.get('p95_prompt_assembly_ms')}")
+        print(f"Avg context tokens (approx.): {summary.get('avg_context_tokens')}")
     print(f"Queries: {summary['queries']}")
     print(f"Avg total ms: {summary['avg_total_ms']}")
     print(f"Median total ms: {summary['median_total_ms']}")
@@ -191,6 +356,15 @@ def main() -> None:
             json.dump(payload, handle, indent=2)
         print(f"\nSaved report to: {args.out}")
 
+    if args.baseline:
+        failures = check_regressions(summary, load_baseline(args.baseline), args.max_regression, args.min_delta_ms)
+        print(f"\n=== Regression check vs {args.baseline} (max +{args.max_regression * 100:.0f}%) ===")
+        if failures:
+            for failure in failures:
+                print(f"  REGRESSION {failure}")
+            sys.exit(1)
+        print("  OK - no regressions")
+
 
 if __name__ == "__main__":
     main()
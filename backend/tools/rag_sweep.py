@@ -0,0 +1,185 @@
+import argparse
+import itertools
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from typing import Dict, List, Tuple
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+sys.path.append(os.path.dirname(__file__))
+
+import bot as bot_module
+from bot import format_context
+from rag_eval import build_offline_bot
+
+DEFAULT_QUERIES = os.path.join(os.path.dirname(__file__), "rag_sweep_queries.json")
+
+
+def parse_list(value: str, cast) -> List:
+    return [cast(item.strip()) for item in value.split(",") if item.strip()]
+
+
+def load_labelled_queries(path: str) -> List[Dict]:
+    """[{ "query": str, "expected_sources": [file basenames] }, ...] or { "queries": [...] }"""
+    with open(path, "r", encoding="utf-8") as handle:
+        payload = json.load(handle)
+    items = payload["queries"] if isinstance(payload, dict) else payload
+    return [{"query": item["query"], "expected_sources": set(item["expected_sources"])} for item in items]
+
+
+def approx_tokens(text: str) -> int:
+    """~4 characters per token for English prose"""
+    return len(text) // 4
+
+
+def reciprocal_rank(sources: List[str], expected: set) -> float:
+    for rank, source in enumerate(sources, start=1):
+        if source in expected:
+            return 1.0 / rank
+    return 0.0
+
+
+def embed_queries(bot, labelled: List[Dict]) -> List[Tuple[List[float], float]]:
+    """Embed every query once per index; retrieval configs reuse the vectors"""
+    embedded = []
+    for item in labelled:
+        start = time.perf_counter()
+        embedding = bot.embeddings.embed_query(item["query"])
+        embedded.append((embedding, (time.perf_counter() - start) * 1000))
+    return embedded
+
+
+def evaluate_retrieval(bot, labelled: List[Dict], embedded: List[Tuple[List[float], float]], k: int, fetch_k: int, lambda_mult: float) -> Dict:
+    recalls, hits, reciprocal_ranks, context_tokens, latencies = [], [], [], [], []
+    for item, (embedding, embedding_ms) in zip(labelled, embedded):
+        start = time.perf_counter()
+        docs = bot.vectorstore.max_marginal_relevance_search_by_vector(
+            embedding, k=k, fetch_k=max(fetch_k, k), lambda_mult=lambda_mult
+        )
+        latencies.append(embedding_ms + (time.perf_counter() - start) * 1000)
+
+        sources = [os.path.basename(doc.metadata.get("source", "Unknown")) for doc in docs]
+        expected = item["expected_sources"]
+        recalls.append(len(expected & set(sources)) / len(expected))
+        hits.append(1.0 if expected & set(sources) else 0.0)
+        reciprocal_ranks.append(reciprocal_rank(sources, expected))
+        context_tokens.append(approx_tokens(format_context(docs)))
+
+    return {
+        "recall_at_k": round(statistics.mean(recalls), 4),
+        "hit_rate_at_k": round(statistics.mean(hits), 4),
+        "mrr": round(statistics.mean(reciprocal_ranks), 4),
+        "avg_context_tokens": round(statistics.mean(context_tokens), 1),
+        "avg_retrieval_ms": round(statistics.mean(latencies), 2),
+        "p95_retrieval_ms": round(statistics.quantiles(latencies, n=20)[-1], 2) if len(latencies) >= 2 else None,
+    }
+
+
+def pick_recommended(rows: List[Dict], tolerance: float) -> Dict:
+    """Fastest configuration whose recall@k and MRR are within tolerance of the best"""
+    best_recall = max(row["recall_at_k"] for row in rows)
+    best_mrr = max(row["mrr"] for row in rows)
+    candidates = [
+        row for row in rows
+        if row["recall_at_k"] >= best_recall - tolerance and row["mrr"] >= best_mrr - tolerance
+    ]
+    return min(candidates, key=lambda row: (row["avg_retrieval_ms"], row["avg_context_tokens"]))
+
+
+def print_table(rows: List[Dict], recommended: Dict) -> None:
+    header = f"{'pdf':>10} {'size':>5} {'ovl':>4} {'k':>3} {'fk':>4} {'lam':>5} {'chunks':>7} {'recall':>7} {'hit':>6} {'mrr':>6} {'ctx_tok':>8} {'avg_ms':>8} {'p95_ms':>8}"
+    print(header)
+    print("-" * len(header))
+    for row in rows:
+        marker = "  <- recommended" if row is recommended else ""
+        print(
+            f"{row['pdf_chunking']:>10} {row['chunk_size']:>5} {row['chunk_overlap']:>4} {row['k']:>3} {row['fetch_k']:>4} {row['lambda_mult']:>5} "
+            f"{row['chunks_indexed']:>7} {row['recall_at_k']:>7} {row['hit_rate_at_k']:>6} {row['mrr']:>6} "
+            f"{row['avg_context_tokens']:>8} {row['avg_retrieval_ms']:>8} {str(row['p95_retrieval_ms']):>8}{marker}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Sweep chunking and MMR retrieval settings (offline, stub LLM)")
+    parser.add_argument("--queries", help="Labelled queries JSON", default=DEFAULT_QUERIES)
+    parser.add_argument("--docs", help="Documents folder to index", default=bot_module.DOCS_DIR)
+    parser.add_argument("--pdf-chunking", default="structured", help="Comma-separated: structured, plain")
+    parser.add_argument("--chunk-sizes", default="250,350,500,800")
+    parser.add_argument("--chunk-overlaps", default="35,80")
+    parser.add_argument("--k", default="3,5")
+    parser.add_argument("--fetch-k", default="10,20")
+    parser.add_argument("--lambda-mult", default="0.5,0.8")
+    parser.add_argument("--tolerance", type=float, default=0.02, help="Quality slack when picking the fastest config")
+    parser.add_argument("--out", help="Optional JSON output path", default="")
+    args = parser.parse_args()
+
+    labelled = load_labelled_queries(args.queries)
+    chunk_configs = [
+        (mode, size, overlap)
+        for mode, size, overlap in itertools.product(
+            parse_list(args.pdf_chunking, str), parse_list(args.chunk_sizes, int), parse_list(args.chunk_overlaps, int)
+        )
+        if overlap < size
+    ]
+    retrieval_configs = list(itertools.product(
+        parse_list(args.k, int), parse_list(args.fetch_k, int), parse_list(args.lambda_mult, float)
+    ))
+
+    rows = []
+    bot = None
+    for pdf_chunking, chunk_size, chunk_overlap in chunk_configs:
+        index_dir = tempfile.mkdtemp(prefix=f"rag_sweep_{pdf_chunking}_{chunk_size}_{chunk_overlap}_")
+        try:
+            print(f"\nBuilding index: pdf_chunking={pdf_chunking} chunk_size={chunk_size} overlap={chunk_overlap}")
+            bot, index_stats = build_offline_bot(
+                args.docs, index_dir, bot=bot,
+                settings={
+                    "chunk_size": chunk_size,
+                    "chunk_overlap": chunk_overlap,
+                    "structured_pdf_chunking": pdf_chunking == "structured",
+                }
+            )
+            print(f"  {index_stats['chunks_indexed']} chunks in {index_stats['index_build_ms']} ms")
+            embedded = embed_queries(bot, labelled)
+
+            for k, fetch_k, lambda_mult in retrieval_configs:
+                row = {
+                    "pdf_chunking": pdf_chunking,
+                    "chunk_size": chunk_size,
+                    "chunk_overlap": chunk_overlap,
+                    "k": k,
+                    "fetch_k": fetch_k,
+                    "lambda_mult": lambda_mult,
+                    "chunks_indexed": index_stats["chunks_indexed"],
+                    "index_build_ms": index_stats["index_build_ms"],
+                }
+                row.update(evaluate_retrieval(bot, labelled, embedded, k, fetch_k, lambda_mult))
+                rows.append(row)
+        finally:
+            shutil.rmtree(index_dir, ignore_errors=True)
+
+    if not rows:
+        print("No configurations to evaluate")
+        return
+
+    recommended = pick_recommended(rows, args.tolerance)
+    print(f"\n=== Sweep results ({len(labelled)} labelled queries) ===")
+    print_table(rows, recommended)
+    print(
+        f"\nRecommended (fastest within {args.tolerance} of best recall/MRR): "
+        f"pdf_chunking={recommended['pdf_chunking']} chunk_size={recommended['chunk_size']} overlap={recommended['chunk_overlap']} "
+        f"k={recommended['k']} fetch_k={recommended['fetch_k']} lambda_mult={recommended['lambda_mult']}"
+    )
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as handle:
+            json.dump({"queries": len(labelled), "recommended": recommended, "results": rows}, handle, indent=2)
+        print(f"\nSaved report to: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -118,8 +118,25 @@ export interface ChatHistoryMessage {
 export interface UploadResponse {
   status: string;
   message: string;
+  jobId?: string;
+  documentId?: string;
 }
 
+export interface UploadJob {
+  jobId: string;
+  filename: string;
+  documentId: string | null;
+  status: 'queued' | 'running' | 'done' | 'skipped' | 'failed';
+  stage: string;
+  progress: number;
+  chunksIndexed: number;
+  deduplicated: boolean;
+  message: string;
+  error: string | null;
+}
+
+const UPLOAD_POLL_INTERVAL_MS = 1000;
+
 export interface StatusResponse {
   initialized: boolean;
   documents_indexed: number;
@@ -171,6 +188,20 @@ export async function updateProfile(
   return data;
 }
 
+// List endpoints are served in cursor-paginated pages; follow nextCursor to collect every item
+async function getAllPages<T>(url: string, key: string): Promise<T[]> {
+  const items: T[] = [];
+  let cursor: string | null = null;
+  do {
+    const { data } = await api.get(url, {
+      params: cursor ? { cursor } : undefined,
+    });
+    items.push(...(data[key] || []));
+    cursor = data.nextCursor || null;
+  } while (cursor);
+  return items;
+}
+
 // ===========================
 // Chat Session APIs
 // ===========================
@@ -184,13 +215,11 @@ export async function createChatSession(
 }
 
 export async function getChatSessions(userId: string): Promise<ChatSession[]> {
-  const { data } = await api.get(`/api/users/${userId}/sessions`);
-  return data.sessions || [];
+  return getAllPages<ChatSession>(`/api/users/${userId}/sessions`, 'sessions');
 }
 
 export async function getChatMessages(sessionId: string): Promise<ChatMessage[]> {
-  const { data } = await api.get(`/api/sessions/${sessionId}/messages`);
-  return data.messages || [];
+  return getAllPages<ChatMessage>(`/api/sessions/${sessionId}/messages`, 'messages');
 }
 
 export async function deleteChatSession(sessionId: string): Promise<{ status: string }> {
@@ -225,8 +254,7 @@ export async function saveMessage(
 }
 
 export async function getSavedMessages(userId: string): Promise<SavedMessage[]> {
-  const { data } = await api.get(`/api/users/${userId}/saved-messages`);
-  return data;
+  return getAllPages<SavedMessage>(`/api/users/${userId}/saved-messages`, 'messages');
 }
 
 // ===========================
@@ -254,8 +282,8 @@ export async function getQueryDistribution(
 // ===========================
 
 export async function getUserDocuments(userId: string) {
-  const { data } = await api.get(`/api/users/${userId}/documents`);
-  return data;
+  const documents = await getAllPages(`/api/users/${userId}/documents`, 'documents');
+  return { documents };
 }
 
 // ===========================
@@ -391,7 +419,25 @@ export async function uploadDocument(file: File, userId?: string): Promise<Uploa
   );
 
   const { data } = await uploadApi.post<UploadResponse>('/api/upload', formData);
+  if (!data.jobId) {
+    return data;
+  }
+
+  // Indexing runs in the background; wait for the job to finish
+  while (true) {
+    const job = await getUploadJob(data.jobId);
+    if (job.status === 'failed') {
+      throw new Error(job.error || job.message);
+    }
+    if (job.status === 'done' || job.status === 'skipped') {
+      return { status: job.status, message: job.message, jobId: job.jobId, documentId: job.documentId ?? undefined };
+    }
+    await new Promise(resolve => setTimeout(resolve, UPLOAD_POLL_INTERVAL_MS));
+  }
+}
 
+export async function getUploadJob(jobId: string): Promise<UploadJob> {
+  const { data } = await api.get<UploadJob>(`/api/upload/jobs/${jobId}`);
   return data;
 }
 